@@ -0,0 +1,63 @@
+import quantizer as qz
+from quantizer.envelope import Envelope
+import numpy as np
+
+
+def test_lru_eviction_by_nbytes():
+    cache = qz.RenderCache(nbytes=3000)
+    for k in "abc":
+        cache.put(k, np.zeros(125))
+    assert cache.get("a") is not None
+    cache.put("d", np.zeros(125))
+    assert cache.get("b") is None
+    assert all(cache.get(k) is not None for k in "acd")
+    assert len(cache) == 3
+    assert (cache.hits, cache.misses) == (4, 1)
+
+
+def test_disk_tier_round_trip(tmp_path):
+    y = np.random.default_rng(0).standard_normal(1000)
+    qz.RenderCache(directory=str(tmp_path)).put("k", y.copy())
+    cache = qz.RenderCache(directory=str(tmp_path))
+    z = cache.get("k")
+    assert isinstance(z, np.memmap)
+    np.testing.assert_array_equal(z, y)
+    assert not z.flags.writeable
+
+
+def test_oscillators_are_cached():
+    cache = qz.RenderCache()
+    qz.Session(beats=1, cache=cache)
+    y = qz.Oscillator(f=440.).get_ndarray()
+    assert qz.Oscillator(f=440.).get_ndarray() is y
+    assert qz.Oscillator(f=441.).get_ndarray() is not y
+    assert (cache.hits, len(cache)) == (1, 2)
+
+
+def test_unreproducible_renders_are_not_cached():
+    cache = qz.RenderCache()
+    qz.Session(beats=1, cache=cache)
+    a = qz.Oscillator(wt=qz.Noise()).get_ndarray()
+    b = qz.Oscillator(wt=qz.Noise()).get_ndarray()
+    assert np.any(a != b)
+    pattern = qz.Pattern(events=[qz.Event(nsamples=1000)])
+    contour = qz.ADSREnvelope(pattern).contour
+    assert len(cache) == 1
+    contour.sustain = lambda e: 0.5
+    Envelope(pattern, contour)
+    assert len(cache) == 1
+
+
+def test_key_follows_the_context():
+    keys = set()
+    for kwargs in (
+        dict(),
+        dict(bpm=90),
+        dict(fs=48000),
+        dict(dtype=np.float64),
+    ):
+        qz.Session(nsamples=10000, **kwargs)
+        keys.add(qz.RenderCache.key(qz.kntxt(), "Oscillator", 440.))
+    assert len(keys) == 4
+    qz.Session(nsamples=10000)
+    assert qz.RenderCache.key(qz.kntxt(), "Oscillator", 440.) in keys
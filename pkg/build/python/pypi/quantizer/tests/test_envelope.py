@@ -0,0 +1,70 @@
+import quantizer as qz
+import numpy as np
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def session():
+    qz.Session(beats=4, dtype=np.float64)
+
+
+def segment(t, a, fs):
+    # segments as concatenated linear ramps
+    return np.concatenate([
+        np.linspace(a[i], a[i + 1], round(t[i] * fs)) for i in range(len(t))
+    ])
+
+
+def reference(pattern, contour, reactive=True):
+    # event by event rendering of the contours
+    fs = qz.kntxt().fs
+    y = np.zeros(len(qz.kntxt()))
+    h = segment(contour.head_t, contour.head_a, fs)
+    t = segment(contour.tail_t, contour.tail_a, fs)
+    val, idx = 0., 0
+    for e in pattern.get_events():
+        n = e.get_nsamples()
+        if not e.get_idle():
+            s = np.full(max(0, n - len(h)), contour.get_sustain(e))
+            c = np.concatenate([h[:n], s, t])[:len(y) - idx]
+            y[idx: idx + len(c)] = c
+            val = c[-1]
+        elif not reactive:
+            y[idx: idx + n] = val
+        idx += n
+    return y
+
+
+def pattern():
+    nsamples = [20000, 500, 30000, 8000, 15000, 1000]
+    return qz.Pattern(events=[
+        qz.Event(
+            idle=i % 3 == 2, nsamples=n, f=100. * (i + 1), a=1. / (i + 1)
+        )
+        for i, n in enumerate(nsamples)
+    ])
+
+
+def test_contour_segments_match_ramps():
+    contour = qz.ADSREnvelope(pattern(), a=0.01, d=0.1, s=0.5).contour
+    fs = qz.kntxt().fs
+    np.testing.assert_array_equal(
+        contour.head(fs), segment(contour.head_t, contour.head_a, fs)
+    )
+    np.testing.assert_array_equal(
+        contour.tail(fs), segment(contour.tail_t, contour.tail_a, fs)
+    )
+
+
+@pytest.mark.parametrize("envelope", [
+    lambda p: qz.ADSREnvelope(p, a=0.01, d=0.1, s=0.5, r=0.2),
+    lambda p: qz.DeltaEnvelope(p),
+    qz.FMEnvelope,
+    qz.AMEnvelope,
+])
+def test_envelopes_match_reference(envelope):
+    p = pattern()
+    env = envelope(p)
+    np.testing.assert_array_equal(
+        env.get_ndarray(), reference(p, env.contour, env.reactive)
+    )
@@ -0,0 +1,145 @@
+import quantizer as qz
+from quantizer.fx import SpectralMonoFX
+import numpy as np
+import pytest
+from scipy.signal import fftconvolve, sosfilt
+
+
+@pytest.fixture(autouse=True)
+def session():
+    qz.Session(beats=1)
+
+
+def noise(nsamples=20000, channels=1, seed=0):
+    x = np.random.default_rng(seed).uniform(-1, 1, (channels, nsamples))
+    return x[0] if channels == 1 else x
+
+
+@pytest.mark.parametrize("dtype", [np.float64, np.float32, np.int16])
+def test_butterworth_dtypes(dtype):
+    x = noise()
+    if dtype is np.int16:
+        x = np.round(x * 2 ** 14)
+    bwf = qz.ButterworthFilter(f=1000)
+    y = bwf.patch(qz.MonoStream(x.astype(dtype))).get_ndarray()
+    assert y.dtype == np.result_type(dtype, np.float32)
+    expected = sosfilt(bwf.sos, x.astype(dtype))
+    np.testing.assert_allclose(y, expected, atol=1e-4 * np.abs(x).max())
+
+
+@pytest.mark.parametrize(
+    "f", [1000, 1000., np.float32(1000), np.int64(1000)]
+)
+def test_scalar_cutoffs(f):
+    x = qz.MonoStream(noise(4096))
+    for fx in (qz.ButterworthFilter, qz.SincFilter):
+        y = fx(f=f).patch(x).get_ndarray()
+        np.testing.assert_allclose(y, fx(f=1000.).patch(x).get_ndarray())
+
+
+def test_patch_starts_from_a_clean_state():
+    x = qz.MonoStream(noise(len(qz.kntxt())))
+    sweep = qz.Controller(np.linspace(200, 4000, len(x)))
+    bwf = qz.ButterworthFilter(f=sweep)
+    y = bwf.patch(x).get_ndarray()
+    np.testing.assert_array_equal(bwf.patch(x).get_ndarray(), y)
+
+
+def test_butterworth_decays_to_zero():
+    x = np.zeros(200000)
+    x[0] = 1.
+    y = qz.ButterworthFilter(f=1000).patch(qz.MonoStream(x)).get_ndarray()
+    np.testing.assert_allclose(y[:1000], sosfilt(
+        qz.ButterworthFilter(f=1000).sos, x[:1000]
+    ), atol=1e-12)
+    assert not np.any(y[-1000:])
+
+
+def blockwise(fx, x, blocksize):
+    fx.reset()
+    return np.concatenate([
+        fx.process(x[..., i: i + blocksize])
+        for i in range(0, x.shape[-1], blocksize)
+    ], axis=-1)
+
+
+@pytest.mark.parametrize("channels", [1, 2])
+def test_butterworth_blocks(channels):
+    x = noise(len(qz.kntxt()), channels)
+    bwf = qz.ButterworthFilter(f=1000, order=5)
+    y = bwf.patch(qz.Stream(x)).get_ndarray()
+    np.testing.assert_allclose(blockwise(bwf, x, 1000), y, atol=1e-12)
+    np.testing.assert_allclose(y, sosfilt(bwf.sos, x), atol=1e-12)
+
+
+def test_sinc_filter_blocks():
+    x = noise(20000, channels=2)
+    sf = qz.SincFilter(f=2000, bandwidth=400, blocksize=1024)
+    y = sf.patch(qz.StereoStream(x)).get_ndarray()
+    np.testing.assert_allclose(
+        y, np.stack([np.convolve(c, sf.h) for c in x]), atol=1e-12
+    )
+    np.testing.assert_allclose(
+        blockwise(sf, x, 777), y[..., :x.shape[-1]], atol=1e-12
+    )
+
+
+@pytest.mark.parametrize("channels", [1, 2])
+def test_swept_butterworth_blocks(channels):
+    x = noise(len(qz.kntxt()), channels)
+    f = qz.Controller(np.geomspace(100, 8000, x.shape[-1]))
+    bwf = qz.ButterworthFilter(f=f, order=5, hop=7)
+    y = bwf.patch(qz.Stream(x)).get_ndarray()
+    np.testing.assert_allclose(blockwise(bwf, x, 1000), y, atol=1e-12)
+
+
+def test_swept_sinc_filter_blocks():
+    x = noise(20000)
+    sweep = qz.Controller(np.geomspace(200, 8000, len(x)))
+    sf = qz.SincFilter(f=sweep, bandwidth=400, blocksize=1024)
+    y = sf.patch(qz.MonoStream(x)).get_ndarray()
+    assert len(y) == len(x) + sf.n - 1
+    # the kernel follows the sweep once per partition of blocksize,
+    # whatever the size of the blocks
+    for blocksize in (1024, 777, 256, 5000):
+        np.testing.assert_allclose(
+            blockwise(sf, x, blocksize), y[:len(x)], atol=1e-12
+        )
+
+
+class Identity(SpectralMonoFX):
+    def transform(self, spectrum):
+        return spectrum
+
+
+@pytest.mark.parametrize("fx", [
+    lambda: Identity(nfft=512),
+    lambda: qz.SpectralGate(threshold=-20, nfft=512),
+    lambda: qz.SpectralEqualizer([(100, -12), (4000, 6)], nfft=512),
+])
+def test_spectral_blocks(fx):
+    fx = fx()
+    x = noise(10000, channels=2)
+    y = fx.patch(qz.StereoStream(x)).get_ndarray()
+    assert y.shape == x.shape
+    z = blockwise(fx, np.concatenate([x, np.zeros((2, fx.latency))], -1), 999)
+    np.testing.assert_allclose(z[..., fx.latency:], y, atol=1e-12)
+    if isinstance(fx, Identity):
+        np.testing.assert_allclose(y, x, atol=1e-12)
+
+
+@pytest.mark.parametrize("mix", [1., 0.3])
+def test_convolution_reverb(mix):
+    rng = np.random.default_rng(1)
+    ir = rng.standard_normal(3000) * np.exp(-np.arange(3000) / 500)
+    x = noise(10000, channels=2)
+    cr = qz.ConvolutionReverb(ir, mix=mix, blocksize=256)
+    y = cr.patch(qz.StereoStream(x)).get_ndarray()
+    wet = fftconvolve(x, ir[np.newaxis], axes=-1)
+    dry = np.zeros_like(wet)
+    dry[..., :x.shape[-1]] = x
+    np.testing.assert_allclose(y, mix * wet + (1 - mix) * dry, atol=1e-12)
+    z = blockwise(cr, x, 1000)
+    np.testing.assert_allclose(
+        z[..., cr.latency:], y[..., :x.shape[-1] - cr.latency], atol=1e-12
+    )
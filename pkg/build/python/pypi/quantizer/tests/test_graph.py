@@ -0,0 +1,84 @@
+import quantizer as qz
+from collections import Counter
+import numpy as np
+import pytest
+import weakref
+
+
+@pytest.fixture(autouse=True)
+def session():
+    qz.Session(beats=1, dtype=np.float64)
+
+
+def patch(calls):
+    g = qz.Graph()
+
+    def node(name, f, inputs=()):
+        def producer(*args):
+            calls[name] += 1
+            return f(*args)
+        g.add(name, producer, inputs)
+
+    node("lfo", lambda: qz.Oscillator(f=5.))
+    node("a", lambda lfo: qz.Oscillator(f=220 + 10 * lfo), ["lfo"])
+    node("b", lambda lfo: qz.Oscillator(f=330 + 10 * lfo), ["lfo"])
+    node("ab", lambda a, b: a.get_ndarray() + b.get_ndarray(), ["a", "b"])
+    node("c", lambda: qz.Oscillator(f=440.))
+    return g
+
+
+def expected():
+    lfo = qz.Oscillator(f=5.)
+    a = qz.Oscillator(f=220 + 10 * lfo).get_ndarray()
+    b = qz.Oscillator(f=330 + 10 * lfo).get_ndarray()
+    return {"ab": a + b, "c": qz.Oscillator(f=440.).get_ndarray()}
+
+
+@pytest.mark.parametrize("workers", [None, 2])
+def test_shared_input_renders_once(workers):
+    calls = Counter()
+    g = patch(calls)
+    assert g.sinks() == ["ab", "c"]
+    y = g.render(workers=workers)
+    assert list(y) == ["ab", "c"]
+    for name, x in expected().items():
+        np.testing.assert_allclose(y[name].get_ndarray(), x, atol=1e-12)
+    assert calls == dict.fromkeys(["lfo", "a", "b", "ab", "c"], 1)
+
+
+@pytest.mark.parametrize("workers", [None, 2])
+def test_only_dependencies_render(workers):
+    calls = Counter()
+    y = patch(calls).render(["a"], workers=workers)
+    assert list(y) == ["a"] and set(calls) == {"lfo", "a"}
+    np.testing.assert_allclose(
+        y["a"].get_ndarray(),
+        qz.Oscillator(f=220 + 10 * qz.Oscillator(f=5.)).get_ndarray(),
+        atol=1e-12,
+    )
+
+
+@pytest.mark.parametrize("outputs", [["d"], ["d", "a"]])
+def test_intermediates_are_released(outputs):
+    g = qz.Graph()
+    refs = dict()
+
+    def keep(name):
+        def producer(x):
+            refs[name] = weakref.ref(x)
+            return 2 * x.get_ndarray()
+        return producer
+
+    g.add("a", lambda: np.ones(len(qz.kntxt())))
+    g.add("b", keep("a"), ["a"])
+    g.add("c", keep("b"), ["b"])
+
+    def last(x):
+        alive = {name: ref() is not None for name, ref in refs.items()}
+        assert alive == {"a": "a" in outputs, "b": False}
+        return x
+
+    g.add("d", last, ["c"])
+    y = g.render(outputs)
+    assert list(y) == outputs
+    np.testing.assert_array_equal(y["d"].get_ndarray(), 4.)
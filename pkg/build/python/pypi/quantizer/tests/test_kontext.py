@@ -0,0 +1,26 @@
+import quantizer as qz
+import numpy as np
+import pytest
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.float64])
+def test_session_dtype(dtype):
+    qz.Session(beats=1, dtype=dtype)
+    assert qz.kntxt().dtype == dtype
+    assert qz.kntxt().t.get_ndarray().dtype == dtype
+    assert qz.Oscillator(f=440.).get_ndarray().dtype == dtype
+    qz.Session(beats=1)
+    assert qz.kntxt().dtype == np.float32
+
+
+def test_scratch_files_are_released(tmp_path):
+    qz.Session(beats=1, scratch=str(tmp_path))
+    buffer = qz.kntxt().allocate((2, 1000))
+    assert isinstance(buffer, np.memmap)
+    view = buffer[1, 10:]
+    view[:] = 1.
+    del buffer
+    assert view.sum() == 990.
+    del view
+    qz.Session(beats=1)
+    assert not list(tmp_path.iterdir())
@@ -0,0 +1,34 @@
+import quantizer as qz
+import numpy as np
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def session():
+    qz.Session(beats=4, dtype=np.float64)
+
+
+def controllers():
+    n = len(qz.kntxt())
+    return {
+        "f": qz.Controller(np.geomspace(100, 2000, n)),
+        "a": qz.Controller(np.linspace(1, 0, n)),
+        "detune": 7,
+    }
+
+
+@pytest.mark.parametrize("wt", [qz.Sine(), qz.Saw(tabulate=True)])
+@pytest.mark.parametrize("blocksize", [1000, 4096])
+def test_lazy_blocks_match_full_render(wt, blocksize):
+    y = qz.Oscillator(wt=wt, **controllers()).get_ndarray()
+    lazy = qz.Oscillator(wt=wt, lazy=True, **controllers())
+    blocks = np.concatenate(list(lazy.blocks(blocksize)))
+    np.testing.assert_allclose(blocks, y, atol=1e-9)
+    np.testing.assert_allclose(lazy.get_ndarray(), y, atol=1e-9)
+
+
+def test_constant_frequency_matches_cumsum():
+    y = qz.Oscillator(f=440.).get_ndarray()
+    phase = np.cumsum(np.full(len(y), 2 * np.pi * 440. / qz.kntxt().fs))
+    # up to the rounding errors accumulated by cumsum
+    np.testing.assert_allclose(y, np.sin(phase), atol=1e-7)
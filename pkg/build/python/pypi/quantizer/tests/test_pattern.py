@@ -0,0 +1,141 @@
+import quantizer as qz
+from copy import deepcopy
+import numpy as np
+import tracemalloc
+
+
+def bar(f=100.):
+    return qz.Pattern(events=[
+        qz.Event(nsamples=10, f=f, a=0.5),
+        qz.Event(nsamples=5, f=2 * f, p=0.25, cc=(1.,)),
+        qz.Event(idle=True, nsamples=7, f=3 * f),
+    ])
+
+
+def columns(events):
+    return [
+        (e.get_nsamples(), e.get_f(), e.get_p(), e.get_a(), e.get_idle())
+        for e in events
+    ]
+
+
+def assert_events(pattern, events):
+    table = pattern.get_event_array()
+    expected = columns(events)
+    assert len(table) == len(expected)
+    for field, column in zip(
+        ("nsamples", "f", "p", "a", "idle"), zip(*expected)
+    ):
+        np.testing.assert_allclose(table[field], column, rtol=1e-12)
+    onsets = np.cumsum([0] + [e[0] for e in expected[:-1]])
+    np.testing.assert_array_equal(table["onset"], onsets)
+    assert list(pattern.get_cc_array()) == [e.get_cc() for e in events]
+
+
+def test_composition_matches_deepcopy():
+    a, b = bar(100.), bar(150.)
+    ea, eb = deepcopy(a.get_events()), deepcopy(b.get_events())
+    song = (a @ b) @ 3 @ a.transpose(st=7)
+    transposed = deepcopy(ea)
+    for e in transposed:
+        e.set_f(qz.transpose(e.get_f(), st=7))
+    assert_events(song, (ea + eb) * 3 + transposed)
+    assert_events(2 @ b, eb * 2)
+
+
+def test_composition_is_copy_on_write():
+    a, b = bar(), bar(200.)
+    expected = deepcopy(a.get_events()) + deepcopy(b.get_events())
+    ab = a @ b
+    a.append(qz.Event(nsamples=3))
+    assert_events(ab, expected)
+
+
+def test_long_arrangement():
+    b = bar()
+    song = qz.Pattern()
+    for _ in range(3000):
+        song = song @ b
+    assert_events(song, deepcopy(b.get_events()) * 3000)
+
+
+def flatten_peak(depth):
+    b = bar()
+    song = qz.Pattern()
+    for _ in range(depth):
+        song = song @ b
+    tracemalloc.start()
+    song.get_event_array()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def test_flatten_is_linear():
+    # four times the depth, about four times the memory (not sixteen)
+    assert flatten_peak(8000) < 6 * flatten_peak(2000)
+
+
+def test_shared_subtrees():
+    p, expected = bar(), columns(bar().get_events())
+    for _ in range(10):
+        p = (p @ p).transpose(st=1) @ p
+        expected = [
+            (n, qz.transpose(f, st=1), ph, a, idle)
+            for n, f, ph, a, idle in expected * 2
+        ] + expected
+    table = p.get_event_array()
+    assert len(table) == len(expected)
+    np.testing.assert_allclose(table["f"], [e[1] for e in expected])
+    np.testing.assert_array_equal(
+        table["onset"], np.cumsum([0] + [e[0] for e in expected[:-1]])
+    )
+
+
+def test_events_are_live():
+    p = bar()
+    ab = p @ bar(200.)
+    p.get_events()[0].set_f(440.)
+    p.events.append(qz.Event(nsamples=3, f=50.))
+    table = p.get_event_array()
+    assert table["f"][0] == 440. and table["f"][-1] == 50.
+    assert len(table) == 4 and table["onset"][-1] == 22
+    # compositions keep the events they were made of
+    assert ab.get_event_array()["f"][0] == 100.
+    assert (p @ 2).get_event_array()["f"][4] == 440.
+    p.events = [qz.Event(nsamples=1)]
+    assert len(p.get_event_array()) == 1
+    p.append(qz.Event(nsamples=2))
+    assert list(p.get_event_array()["onset"]) == [0, 1]
+
+
+def test_events_given_are_live():
+    events = [qz.Event(nsamples=10, f=100.), qz.Event(nsamples=5)]
+    p = qz.Pattern(events=events)
+    assert p.events is events and p.get_events()[0] is events[0]
+    assert p.get_event_array()["f"][0] == 100.
+    events[0].set_f(200.)
+    events[0].nsamples = 20
+    assert p.get_event_array()["f"][0] == 200.
+    assert p.get_event_array()["onset"][1] == 20
+    events[1] = qz.Event(nsamples=5, f=300.)
+    assert p.get_event_array()["f"][1] == 300.
+
+
+def test_event_columns_are_kept_until_a_change():
+    p = qz.Pattern(events=[qz.Event(nsamples=1) for _ in range(100)])
+    table = p.get_event_array()
+    qz.Event()
+    assert p.get_event_array() is table
+    p.events[3].set_a(0.5)
+    assert p.get_event_array() is not table
+
+
+def test_callable_sustain_keeps_the_pattern_columnar():
+    qz.Session(beats=1)
+    p = bar() @ bar()
+    table = p.get_event_array()
+    contour = qz.ADSREnvelope(p).contour
+    contour.sustain = lambda e: e.get_a()
+    np.testing.assert_array_equal(contour.get_sustains(p), table["a"])
+    assert p.get_event_array() is table
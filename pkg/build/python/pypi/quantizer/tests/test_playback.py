@@ -0,0 +1,55 @@
+import quantizer as qz
+import numpy as np
+import pytest
+import threading
+
+
+@pytest.mark.parametrize("realtime,nsamples", [(False, 88200), (True, 8820)])
+def test_null_device_plays_the_source(realtime, nsamples):
+    qz.Session(beats=1)
+    y = qz.Oscillator(f=np.full(nsamples, 440.), lazy=True)
+    devices = []
+
+    def device(**kwargs):
+        devices.append(qz.NullDevice(realtime=realtime, **kwargs))
+        return devices[-1]
+
+    player = qz.Player(y, blocksize=512, device=device)
+    player.play(timeout=30)
+    output = np.concatenate(devices[0].output)[:, 0]
+    assert player.underruns == 0
+    np.testing.assert_allclose(output[:nsamples], y.get_ndarray(), atol=1e-6)
+    assert not np.any(output[nsamples:])
+
+
+def producers():
+    return [t for t in threading.enumerate() if "_produce" in t.name]
+
+
+def test_device_error_stops_the_producer():
+    qz.Session(beats=1)
+
+    def device(**kwargs):
+        raise OSError("no output device")
+
+    player = qz.Player(qz.Oscillator(lazy=True), device=device)
+    with pytest.raises(OSError):
+        player.play(timeout=10)
+    assert not producers()
+
+
+def test_source_error_is_raised():
+    qz.Session(beats=1)
+
+    def source():
+        yield np.zeros(512)
+        raise ValueError("render failed")
+
+    player = qz.Player(
+        source(),
+        blocksize=512,
+        device=lambda **kwargs: qz.NullDevice(realtime=False, **kwargs),
+    )
+    with pytest.raises(ValueError, match="render failed"):
+        player.play(timeout=10)
+    assert not producers()
@@ -0,0 +1,48 @@
+import quantizer as qz
+import numpy as np
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def session():
+    qz.Session(beats=2, dtype=np.float64)
+
+
+def voices():
+    pattern = qz.Pattern(events=[
+        qz.Event(nsamples=20000, f=220.),
+        qz.Event(nsamples=10000, f=330., a=0.5),
+        qz.Event(idle=True, nsamples=5000),
+        qz.Event(nsamples=20000, f=440.),
+    ])
+    return [
+        qz.Voice(pattern=pattern, level=-6),
+        qz.Voice(qz.Square(), pattern=pattern.transpose(st=7), level=0),
+        qz.Voice(f=110., a=0.25, fx=[qz.ButterworthFilter(f=500)], level=3),
+    ]
+
+
+def serial(voices):
+    n = len(qz.kntxt())
+    return np.stack([voice.render()[:n] for voice in voices])
+
+
+@pytest.mark.parametrize("mode", ["thread", "process"])
+def test_modes_match_serial_render(mode):
+    y = qz.Scheduler(voices(), workers=2, mode=mode).render()
+    assert y.shape == (3, len(qz.kntxt())) and y.dtype == np.float64
+    np.testing.assert_allclose(y, serial(voices()), atol=1e-12)
+
+
+def test_mix_with_levels():
+    y = qz.Scheduler(voices(), workers=2).mix().get_ndarray()
+    expected = sum(
+        qz.db2mag(level) * x
+        for level, x in zip((-6, 0, 3), serial(voices()))
+    )
+    np.testing.assert_allclose(y, expected, atol=1e-12)
+
+
+def test_unknown_mode():
+    with pytest.raises(RuntimeError):
+        qz.Scheduler(voices(), mode="fiber")
@@ -0,0 +1,65 @@
+import quantizer as qz
+import numpy as np
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def session():
+    qz.Session(beats=1)
+
+
+def streams(*shapes, seed=0):
+    rng = np.random.default_rng(seed)
+    return [qz.Stream(rng.uniform(-1, 1, shape)) for shape in shapes]
+
+
+def reference(streams, line_levels):
+    ndarrays = [s.get_ndarray() for s in streams]
+    shape = np.broadcast_shapes(*[x.shape[:-1] for x in ndarrays])
+    mix = np.zeros(shape + (max(x.shape[-1] for x in ndarrays),))
+    for x, level in zip(ndarrays, line_levels):
+        mix[..., :x.shape[-1]] += x * qz.db2mag(level)
+    return mix
+
+
+@pytest.mark.parametrize("line_levels", [None, [0, -6, 3]])
+def test_mix_of_different_lengths(line_levels):
+    s = streams(1000, 2500, 1700)
+    y = qz.Sequencer._mix(s, line_levels).get_ndarray()
+    assert y.shape == (2500,)
+    np.testing.assert_allclose(
+        y, reference(s, line_levels or [0] * 3), rtol=1e-5, atol=1e-6
+    )
+
+
+def test_gains_across_chunks(monkeypatch):
+    monkeypatch.setattr(qz.Context, "chunksize", 256)
+    s = streams(1000, 700, 1000, seed=1)
+    y = qz.Sequencer._mix(s, [-3, 6, 0]).get_ndarray()
+    np.testing.assert_allclose(
+        y, reference(s, [-3, 6, 0]), rtol=1e-5, atol=1e-6
+    )
+
+
+def test_mono_and_stereo(monkeypatch):
+    monkeypatch.setattr(qz.Context, "chunksize", 300)
+    s = streams(1000, (2, 800), (1, 1200), seed=2)
+    y = qz.Sequencer._mix(s, [-6, 0, -12]).get_ndarray()
+    assert y.shape == (2, 1200)
+    np.testing.assert_allclose(
+        y, reference(s, [-6, 0, -12]), rtol=1e-5, atol=1e-6
+    )
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.float64])
+def test_mix_dtype(dtype):
+    qz.Session(beats=1, dtype=dtype)
+    s = streams(100, 200)
+    s[0] = qz.Stream(s[0].get_ndarray().astype(np.float32))
+    y = qz.Sequencer._mix(s, [-6, -6]).get_ndarray()
+    assert y.dtype == dtype
+    sequencer = qz.Sequencer(streams=s, master_level=-6)
+    assert sequencer.mix().dtype == dtype
+    np.testing.assert_allclose(
+        sequencer.mix(), reference(s, [-6, -6]), rtol=1e-5, atol=1e-6
+    )
@@ -0,0 +1,65 @@
+import quantizer as qz
+from quantizer.kernel.wav import WaveWriter
+import numpy as np
+import pytest
+from scipy.io import wavfile
+
+# scipy reads 24-bit PCM left-justified into int32
+SCALE = {"int16": 2 ** 15, "int24": 2 ** 31, "float32": 1}
+LSB = {"int16": 2 ** -15, "int24": 2 ** -23, "float32": 1e-7}
+
+
+def signal(nsamples=5000):
+    x = np.arange(nsamples)
+    return 0.5 * np.sin(2 * np.pi * 440 * x / 44100)
+
+
+@pytest.mark.parametrize("format", ["int16", "int24", "float32"])
+@pytest.mark.parametrize("channels", [1, 2])
+def test_bounce_round_trip(tmp_path, format, channels):
+    y = signal()
+    if channels == 2:
+        y = np.stack([y, -y])
+    file_path = str(tmp_path / f"{format}-{channels}.wav")
+    qz.bounce(y, file_path, 44100, format=format)
+    fs, r = wavfile.read(file_path)
+    assert fs == 44100
+    r = r / SCALE[format]
+    if channels == 2:
+        r = r.T
+    assert r.shape == y.shape
+    assert np.max(np.abs(r - y)) <= 2 * LSB[format]
+
+
+def test_blocks_equal_one_write(tmp_path):
+    y = signal()
+    with WaveWriter(
+        str(tmp_path / "a.wav"), 44100, format="int24", dither=False
+    ) as writer:
+        writer.write(y)
+    with WaveWriter(
+        str(tmp_path / "b.wav"), 44100, format="int24", dither=False
+    ) as writer:
+        writer.write_all(y, blocksize=333)
+    a = open(tmp_path / "a.wav", "rb").read()
+    b = open(tmp_path / "b.wav", "rb").read()
+    assert a == b
+
+
+def test_export_stereo_int24(tmp_path):
+    qz.Session(beats=1)
+    y = signal(len(qz.kntxt()))
+    mix = qz.StereoStream(np.stack([y, -y]).astype(np.float32))
+    file_path = str(tmp_path / "export.wav")
+    qz.Sequencer(streams=[mix]).export(file_path, format="int24")
+    _, r = wavfile.read(file_path)
+    assert np.max(np.abs(r.T / SCALE["int24"] - mix.get_ndarray())) < 1e-6
+
+
+def test_channels_last_is_rejected(tmp_path):
+    y = np.stack([signal(), signal()], axis=-1)
+    with pytest.raises(RuntimeError, match="transpose"):
+        qz.bounce(y, str(tmp_path / "a.wav"), 44100)
+    with WaveWriter(str(tmp_path / "b.wav"), 44100, channels=2) as writer:
+        with pytest.raises(RuntimeError, match=r"\(2, nsamples\)"):
+            writer.write(y)
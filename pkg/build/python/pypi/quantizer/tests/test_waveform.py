@@ -0,0 +1,64 @@
+from quantizer.kernel.waveform import Waveform
+import numpy as np
+import pytest
+
+
+def test_deferred_matches_eager():
+    rng = np.random.default_rng(0)
+    a, b, c = (Waveform(rng.standard_normal(10000)) for _ in range(3))
+    eager = (a + b) * c + 2. * a
+    deferred = (a.defer() + b) * c + 2. * a
+    np.testing.assert_allclose(deferred.get_ndarray(), eager.get_ndarray())
+    blocks = np.concatenate(list(((a.defer() + b) * c).blocks(999)))
+    np.testing.assert_allclose(blocks, ((a + b) * c).get_ndarray())
+
+
+def test_deferred_stereo():
+    x = Waveform(np.ones((2, 5000)))
+    y = (x.defer() + Waveform(np.arange(5000.))).get_ndarray()
+    assert y.shape == (2, 5000)
+    np.testing.assert_array_equal(y[1], 1 + np.arange(5000.))
+
+
+@pytest.mark.parametrize("swap", [False, True])
+def test_deferred_length_mismatch(swap):
+    a, b = Waveform(np.ones(4096)), Waveform(np.ones(2048))
+    if swap:
+        a, b = b, a
+    with pytest.raises(ValueError):
+        a + b
+    with pytest.raises(ValueError):
+        (a.defer() + b).get_ndarray()
+    with pytest.raises(ValueError):
+        next((a.defer() + b).blocks())
+
+
+def test_deferred_mix_of_voices():
+    rng = np.random.default_rng(1)
+    n = 3 * 2 ** 16 + 123
+    voices = [
+        (Waveform(rng.standard_normal(n).astype(np.float32)),
+         Waveform(rng.random(n).astype(np.float32)))
+        for _ in range(16)
+    ]
+    eager, deferred = 0., 0.
+    for osc, env in voices:
+        eager = eager + osc * env
+        deferred = deferred + osc.defer() * env
+    np.testing.assert_allclose(
+        deferred.get_ndarray(), eager.get_ndarray(), rtol=1e-6, atol=1e-5
+    )
+    assert deferred.get_ndarray().dtype == np.float32
+
+
+def test_deferred_shared_subexpression():
+    rng = np.random.default_rng(2)
+    a, b = Waveform(rng.random(5000)), Waveform(rng.random(5000))
+    x = a.defer() + b
+    y = x * x + (x * 2.) * (b.defer() * a)
+    expected = (a + b) * (a + b) + ((a + b) * 2.) * (b * a)
+    np.testing.assert_allclose(y.get_ndarray(), expected.get_ndarray())
+    blocks = np.concatenate(list((x * x + x).blocks(777)))
+    np.testing.assert_allclose(
+        blocks, ((a + b) * (a + b) + (a + b)).get_ndarray()
+    )
@@ -0,0 +1,32 @@
+import quantizer as qz
+import numpy as np
+import pytest
+
+WAVETABLES = [qz.Sine, qz.Square, qz.Saw, qz.Triangle]
+
+
+@pytest.mark.parametrize("wt", WAVETABLES)
+def test_fixed_range(wt):
+    x = np.linspace(-np.pi, np.pi, 1001)
+    y = wt().render(x)
+    assert np.max(np.abs(y)) <= 1.
+    # no data dependent rescaling: a part renders as in the whole
+    np.testing.assert_array_equal(wt().render(x[:100]), y[:100])
+
+
+@pytest.mark.parametrize("wt", WAVETABLES)
+def test_discretize(wt):
+    qz.Session(beats=1)
+    y = wt().discretize(f=441.)
+    assert len(y) == 100
+    np.testing.assert_array_equal(y, wt.fn(np.linspace(-np.pi, np.pi, 100)))
+
+
+@pytest.mark.parametrize("wt", WAVETABLES)
+def test_tabulated_matches_fn(wt):
+    qz.Session(beats=1)
+    x = np.linspace(-np.pi, np.pi, 1000, endpoint=False)
+    y = wt(tabulate=True, size=2 ** 14).render(x)
+    # away from the discontinuities of square and saw
+    keep = (np.abs(x) > 0.05) & (np.abs(x) < np.pi - 0.05)
+    np.testing.assert_allclose(y[keep], wt.fn(x)[keep], atol=0.02)
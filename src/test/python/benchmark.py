@@ -0,0 +1,227 @@
+"""
+Benchmarks of the render hot paths.
+
+Every benchmark renders a session of a given length and reports the wall
+clock time, the realtime factor (seconds of audio rendered per second of
+wall clock time) and the peak memory traced while rendering.
+
+    cd src/tree/python
+    python ../../test/python/benchmark.py [-k FILTER] [--save FILE]
+                                          [--compare FILE] [--tolerance X]
+
+--compare exits with a non-zero status if a benchmark got slower or
+needs more memory than the saved baseline by more than the tolerance.
+"""
+import quantizer as qz
+import argparse
+import itertools
+import json
+import numpy as np
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BEATS = (16, 64, 256)
+VOICES = (1, 8, 32)
+DENSITY = (1, 4, 16)
+REPEAT = 3
+SCRATCH = tempfile.TemporaryDirectory()
+
+
+def session(beats):
+    qz.Session(beats=beats)
+    return qz.kntxt().nsamples / qz.kntxt().fs
+
+
+def pattern(beats, density):
+    nsamples = qz.beats2samples(1 / density, qz.kntxt().bpm, qz.kntxt().fs)
+    steps = [
+        qz.Event(nsamples=nsamples, f=qz.midi2freq(36 + i % 12))
+        for i in range(density)
+    ]
+    return qz.Pattern(events=steps) @ int(beats)
+
+
+def bench_oscillator(beats, wt):
+    duration = session(beats)
+    wavetables = {
+        "sine": qz.Sine(),
+        "square": qz.Square(),
+        "saw": qz.Saw(),
+        "triangle": qz.Triangle(),
+        "noise": qz.Noise(),
+    }
+    w = wavetables[wt]
+    return duration, lambda: qz.Oscillator(w, f=110.)
+
+
+def bench_envelope(beats, envelope, density):
+    duration = session(beats)
+    envelopes = {
+        "adsr": qz.ADSREnvelope,
+        "delta": qz.DeltaEnvelope,
+        "fm": qz.FMEnvelope,
+    }
+    p = pattern(beats, density)
+    p.get_event_array()
+    return duration, lambda: envelopes[envelope](p)
+
+
+def bench_sinc_filter(beats, f):
+    duration = session(beats)
+    osc = qz.Oscillator(qz.Saw(), f=110.)
+    return duration, lambda: qz.SincFilter(f=f).patch(osc)
+
+
+def bench_butterworth_filter(beats, order):
+    duration = session(beats)
+    osc = qz.Oscillator(qz.Saw(), f=110.)
+    return duration, lambda: qz.ButterworthFilter(order=order).patch(osc)
+
+
+def bench_mix(beats, voices):
+    duration = session(beats)
+    rng = np.random.default_rng(0)
+    streams = [
+        qz.Stream(rng.uniform(-1, 1, qz.kntxt().nsamples))
+        for _ in range(voices)
+    ]
+    levels = [-6.] * voices
+    return duration, lambda: qz.Sequencer._mix(streams, levels)
+
+
+def bench_load_yaml(beats, density):
+    duration = session(beats)
+    step = 1 / density
+    events = ", ".join(
+        f"[{step}, {36 + i % 12}, 100]" for i in range(int(beats * density))
+    )
+    file_path = os.path.join(SCRATCH.name, f"{beats}-{density}.yaml")
+    with open(file_path, "w") as f:
+        f.write(f"pattern: [{events}]\n")
+    return duration, lambda: qz.Sequencer().load_yaml(file_path)
+
+
+BENCHMARKS = {
+    "oscillator": (
+        bench_oscillator,
+        dict(beats=BEATS, wt=("sine", "square", "saw", "triangle", "noise")),
+    ),
+    "envelope": (
+        bench_envelope,
+        dict(beats=BEATS, envelope=("adsr", "delta", "fm"), density=DENSITY),
+    ),
+    "sinc_filter": (
+        bench_sinc_filter,
+        dict(beats=BEATS, f=(1000, 100)),
+    ),
+    "butterworth_filter": (
+        bench_butterworth_filter,
+        dict(beats=BEATS, order=(2, 8)),
+    ),
+    "mix": (
+        bench_mix,
+        dict(beats=BEATS, voices=VOICES),
+    ),
+    "load_yaml": (
+        bench_load_yaml,
+        dict(beats=BEATS, density=DENSITY),
+    ),
+}
+
+
+def measure(fn, repeat=REPEAT):
+    """
+    Best wall clock time out of repeat runs (after one warm-up run, which
+    also compiles the numba kernels) and peak traced memory of one run.
+    """
+    fn()
+    seconds = np.inf
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        seconds = min(seconds, time.perf_counter() - t)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, peak
+
+
+def run(pattern_filter=None, repeat=REPEAT):
+    results = dict()
+    for name, (bench, grid) in BENCHMARKS.items():
+        for values in itertools.product(*grid.values()):
+            params = dict(zip(grid.keys(), values))
+            key = name + "[" + ",".join(f"{k}={v}" for k, v in params.items())
+            key += "]"
+            if pattern_filter and pattern_filter not in key:
+                continue
+            try:
+                duration, fn = bench(**params)
+                seconds, peak = measure(fn, repeat)
+                results[key] = dict(
+                    seconds=seconds,
+                    realtime=duration / seconds,
+                    peak=peak,
+                )
+            except Exception as exception:
+                results[key] = dict(error=repr(exception))
+            report(key, results[key])
+    return results
+
+
+def report(key, result):
+    if "error" in result:
+        print(f"{key:<60} ERROR {result['error']}")
+    else:
+        print(
+            f"{key:<60} {result['seconds'] * 1e3:>10.2f} ms"
+            f" {result['realtime']:>10.1f} x realtime"
+            f" {result['peak'] / 2 ** 20:>10.1f} MiB"
+        )
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for key, result in results.items():
+        reference = baseline.get(key)
+        if not reference or "error" in reference:
+            continue
+        if "error" in result:
+            regressions.append(f"{key}: {result['error']}")
+            continue
+        for metric in ("seconds", "peak"):
+            if result[metric] > reference[metric] * (1 + tolerance):
+                regressions.append(
+                    f"{key}: {metric} {reference[metric]:.4g} -> "
+                    f"{result[metric]:.4g}"
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("-k", dest="pattern_filter", default=None)
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--save", default=None)
+    parser.add_argument("--compare", default=None)
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+    results = run(args.pattern_filter, args.repeat)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare, "r") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print("REGRESSION", regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,19 @@
+from quantizer.kernel.cache import (
+    RenderCache
+)
 from quantizer.kernel.kontext import (
     kntxt, Context, Session, Experiment
 )
+from quantizer.kernel.playback import (
+    RingBuffer, NullDevice, Player
+)
 from quantizer.kernel.util import (
-    PI, beats2samples, samples2beats, bounce, broadcast, mag2db, db2mag,
-    midi2freq, midi2mag, minmaxscale, minmaxscale_i16, normalize, spn2midi,
-    transpose
+    PI, BLOCKSIZE, beats2samples, samples2beats, bounce, broadcast, mag2db,
+    db2mag, midi2freq, midi2mag, minmaxscale, minmaxscale_i16, normalize,
+    spn2midi, transpose
 )
 from quantizer.kernel.waveform import (
-    Waveform, Stream, Controller
+    Waveform, Expression, Stream, Controller
 )
 from quantizer.controller import (
     UnipolarController, BipolarController, StaticController
@@ -17,11 +23,18 @@ from quantizer.envelope import (
     AME, ADSRE, DE
 )
 from quantizer.fx import (
-    SincFilter, ButterworthFilter, SF, BWF
+    SincFilter, ButterworthFilter, SpectralGate, SpectralEqualizer,
+    ConvolutionReverb, SF, BWF, SG, SEQ, CR
+)
+from quantizer.graph import (
+    Graph
 )
 from quantizer.oscillator import (
     Oscillator, Osc
 )
+from quantizer.scheduler import (
+    Voice, Scheduler
+)
 from quantizer.sequencer import (
     Event, Pattern, Sequencer
 )
@@ -32,16 +45,22 @@ from quantizer.wavetable import (
     Sine, Square, Saw, Triangle, Noise, Sin, Squ, Tri
 )
 
+kernel_cache = [
+    "RenderCache"
+]
 kernel_kontext = [
     "kntxt", "Context", "Session", "Experiment"
 ]
+kernel_playback = [
+    "RingBuffer", "NullDevice", "Player"
+]
 kernel_util = [
-    "PI", "beats2samples", "samples2beats", "bounce", "broadcast", "mag2db",
-    "db2mag", "midi2freq", "midi2mag", "minmaxscale", "minmaxscale_i16",
-    "normalize", "spn2midi", "transpose"
+    "PI", "BLOCKSIZE", "beats2samples", "samples2beats", "bounce", "broadcast",
+    "mag2db", "db2mag", "midi2freq", "midi2mag", "minmaxscale",
+    "minmaxscale_i16", "normalize", "spn2midi", "transpose"
 ]
 kernel_waveform = [
-    "Waveform", "Stream", "Controller"
+    "Waveform", "Expression", "Stream", "Controller"
 ]
 controller = [
     "UnipolarController", "BipolarController", "StaticController"
@@ -51,11 +70,18 @@ envelope = [
     "FME", "PME", "AME", "ADSRE", "DE"
 ]
 fx = [
-    "SincFilter", "ButterworthFilter", "SF", "BWF"
+    "SincFilter", "ButterworthFilter", "SpectralGate", "SpectralEqualizer",
+    "ConvolutionReverb", "SF", "BWF", "SG", "SEQ", "CR"
+]
+graph = [
+    "Graph"
 ]
 oscillator = [
     "Oscillator", "Osc"
 ]
+scheduler = [
+    "Voice", "Scheduler"
+]
 sequencer = [
     "Event", "Pattern", "Sequencer"
 ]
@@ -67,13 +93,17 @@ wavetable = [
 ]
 
 __all__ = (
+    kernel_cache +
     kernel_kontext +
+    kernel_playback +
     kernel_util +
     kernel_waveform +
     controller +
     envelope +
     fx +
+    graph +
     oscillator +
+    scheduler +
     sequencer +
     stream +
     wavetable
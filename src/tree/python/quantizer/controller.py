@@ -17,11 +17,22 @@ class StaticController(Controller):
         scalar: Scalar,
         nsamples: Integer = None,
     ):
+        """
+        Constant controller: the samples are a read-only, 0-stride view of
+        the scalar, so no full-length buffer is allocated.
+        """
         if not nsamples:
             nsamples = len(kntxt())
-        ndarray = np.zeros(nsamples)
-        ndarray.fill(scalar)
-        super().__init__(ndarray)
+        self.scalar = scalar
+        super().__init__(
+            np.broadcast_to(np.asarray(scalar, dtype=kntxt().dtype), nsamples)
+        )
+
+    def get_scalar(self):
+        return self.scalar
+
+    def fingerprint(self):
+        return self.scalar, len(self._ndarray)
 
 
 def cast(arg: (Scalar, Array, Controller)) -> Controller:
@@ -29,8 +40,37 @@ def cast(arg: (Scalar, Array, Controller)) -> Controller:
         return StaticController(arg)
     elif isinstance(arg, Array):
         return Controller(arg)
+    elif isinstance(arg, Controller):
+        return arg
     else:
         try:
             return Controller(arg.get_ndarray())
         except AttributeError:
             raise RuntimeError
+
+
+def constant(c: Controller) -> Scalar:
+    """
+    Value of a constant controller (a StaticController or any 0-stride
+    view of a scalar), None if the controller varies.
+    """
+    if isinstance(c, StaticController):
+        return c.get_scalar()
+    ndarray = c.get_ndarray()
+    if ndarray.ndim == 1 and len(ndarray) and ndarray.strides == (0,):
+        return ndarray[0].item()
+    return None
+
+
+def window(c: Controller, start: Integer, stop: Integer) -> Array:
+    """
+    Samples [start, stop) of a controller; the last value is held beyond
+    the end of the controller.
+    """
+    ndarray = c.get_ndarray()
+    y = ndarray[start: stop]
+    if len(y) < stop - start:
+        y = np.concatenate([
+            y, np.full(stop - start - len(y), ndarray[-1], dtype=y.dtype)
+        ])
+    return y
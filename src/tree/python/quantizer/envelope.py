@@ -1,5 +1,8 @@
 from quantizer.kernel.kontext import kntxt
-from quantizer.kernel.util import Array, Callable, Dict
+from quantizer.kernel.util import (
+    Array, Boolean, Callable, Dict, Float, Integer, Scalar, String, Tuple
+)
+from quantizer.kernel.cache import cached
 from quantizer.controller import UnipolarController
 from quantizer.sequencer import Event, Pattern
 from numba import jit
@@ -10,9 +13,16 @@ class Contour:
     def __init__(
         self,
         head: Dict,
-        sustain: Callable,
+        sustain: (Scalar, String, Callable),
         tail: Dict,
     ):
+        """
+        :param head: attack segments, breakpoints 'a', durations 't' [s]
+            and curvatures 'exp'
+        :param sustain: sustain level: a constant, the name of an event
+            field ('f', 'p' or 'a') or a callable of the event
+        :param tail: release segments, as head
+        """
         self.head_a = head['a']
         self.head_t = head['t']
         self.head_exp = head['exp']
@@ -20,37 +30,198 @@ class Contour:
         self.tail_a = tail['a']
         self.tail_t = tail['t']
         self.tail_exp = tail['exp']
+        self._segments = dict()
 
-    def render(self, e: Event) -> Array:
-        nsamples = e.get_nsamples()
-        h = self._segment(self.head_t, self.head_a, kntxt().fs)
-        if nsamples <= len(h):
-            hs = h[:nsamples]
+    def fingerprint(self) -> Tuple:
+        return (
+            self.head_a, self.head_t, self.head_exp,
+            self.sustain,
+            self.tail_a, self.tail_t, self.tail_exp,
+        )
+
+    def head(self, fs: Integer) -> Array:
+        return self._memoize(
+            'head', self.head_t, self.head_a, self.head_exp, fs
+        )
+
+    def tail(self, fs: Integer) -> Array:
+        return self._memoize(
+            'tail', self.tail_t, self.tail_a, self.tail_exp, fs
+        )
+
+    def _memoize(self, key, t, a, exp, fs):
+        """
+        Segments only depend on (t, a, exp, fs): they are rendered once per
+        sampling frequency (and sample dtype) and shared (read-only) by all
+        events.
+        """
+        dtype = kntxt().dtype
+        if (key, fs, dtype) not in self._segments:
+            y = self._segment(
+                np.asarray(t, dtype=np.float64),
+                np.asarray(a, dtype=np.float64),
+                np.asarray(exp, dtype=np.float64),
+                fs,
+            ).astype(dtype, copy=False)
+            y.flags.writeable = False
+            self._segments[(key, fs, dtype)] = y
+        return self._segments[(key, fs, dtype)]
+
+    def get_sustain(self, e: Event) -> Float:
+        if isinstance(self.sustain, String):
+            return float(getattr(e, self.sustain))
+        elif isinstance(self.sustain, Scalar):
+            return float(self.sustain)
         else:
-            s = np.zeros(nsamples - len(h))
-            s.fill(self.sustain(e))
-            hs = np.concatenate([h, s])
-        t = self._segment(self.tail_t, self.tail_a, kntxt().fs)
-        hst = np.concatenate([hs, t])
+            return float(self.sustain(e))
+
+    def get_sustains(self, pattern: Pattern) -> Array:
+        """
+        Sustain level of every event of pattern; an event field name or a
+        constant is resolved without visiting the events one by one.
+        """
+        if isinstance(self.sustain, String):
+            return pattern.get_event_array()[self.sustain].astype(np.float64)
+        elif isinstance(self.sustain, Scalar):
+            return np.full(len(pattern.get_event_array()), self.sustain, float)
+        else:
+            return np.array(
+                [self.sustain(e) for e in pattern.iter_events()], dtype=float
+            )
+
+    def render(self, e: Event) -> Array:
+        hst = np.empty(
+            e.get_nsamples() + len(self.tail(kntxt().fs)),
+            dtype=kntxt().dtype,
+        )
+        self.render_into(hst, 0, e)
         return hst
 
-    @staticmethod
-    @jit(nopython=True, cache=True)
-    def _segment(t, a, fs):
-        y = np.linspace(
-            a[0],
-            a[1],
-            round(t[0] * fs),
+    def render_into(
+        self,
+        out: Array,
+        idx: Integer,
+        e: Event,
+        stop: Integer = None,
+    ) -> Float:
+        """
+        Rendering of event e straight into out, starting at sample idx;
+        samples at or beyond stop (default: the end of out) are dropped.
+
+        :return: last value of the contour
+        """
+        return self._render(
+            out[:stop],
+            np.array([idx]),
+            np.array([e.get_nsamples()]),
+            np.array([False]),
+            np.array([self.get_sustain(e)]),
+            self.head(kntxt().fs),
+            self.tail(kntxt().fs),
+            True,
         )
-        for i in range(1, len(t)):
-            y = np.concatenate((
-                y,
-                np.linspace(
-                    a[i],
-                    a[i + 1],
-                    round(t[i] * fs),
-                )
-            ))
+
+    def render_pattern(
+        self,
+        out: Array,
+        pattern: Pattern,
+        reactive: Boolean = True,
+    ) -> None:
+        """
+        Rendering of all events of pattern into out in a single call.
+        """
+        events = pattern.get_event_array()
+        sustain = self.get_sustains(pattern)
+        h = self.head(kntxt().fs)
+        t = self.tail(kntxt().fs)
+        if len(h) or len(t):
+            self._render(
+                out,
+                events['onset'],
+                events['nsamples'],
+                events['idle'],
+                sustain,
+                h,
+                t,
+                reactive,
+            )
+            return None
+
+        # without head and tail the contour is a step function
+        events = events[events['onset'] < len(out)]
+        sustain = sustain[:len(events)]
+        if not reactive:
+            # idle events hold the level of the last active event
+            active = np.where(
+                ~events['idle'], np.arange(len(events)), -1
+            )
+            np.maximum.accumulate(active, out=active)
+            sustain = np.where(active >= 0, sustain[active], 0.)
+        else:
+            sustain = np.where(events['idle'], 0., sustain)
+        steps = np.repeat(sustain.astype(out.dtype), events['nsamples'])
+        n = min(len(out), len(steps))
+        out[:n] = steps[:n]
+        return None
+
+    @staticmethod
+    @jit(nopython=True, nogil=True, cache=True)
+    def _render(out, onset, nsamples, idle, sustain, h, t, reactive):
+        # a contour is only rendered up to the onset of the next active
+        # event, which overwrites everything from there on
+        stops = np.empty(len(onset), dtype=np.int64)
+        stop = len(out)
+        for i in range(len(onset) - 1, -1, -1):
+            stops[i] = stop
+            if not idle[i]:
+                stop = min(onset[i], len(out))
+        val = 0.
+        for i in range(len(onset)):
+            idx = onset[i]
+            if idx >= len(out):
+                break
+            if idle[i]:
+                if not reactive:
+                    for j in range(idx, min(idx + nsamples[i], len(out))):
+                        out[j] = val
+                continue
+            n = min(nsamples[i], stops[i] - idx)
+            for j in range(n):
+                out[idx + j] = h[j] if j < len(h) else sustain[i]
+            n = min(len(t), stops[i] - idx - nsamples[i])
+            for j in range(n):
+                out[idx + nsamples[i] + j] = t[j]
+            if len(t):
+                val = t[-1]
+            elif 0 < nsamples[i] <= len(h):
+                val = h[nsamples[i] - 1]
+            else:
+                val = sustain[i]
+        return val
+
+    @staticmethod
+    @jit(nopython=True, nogil=True, cache=True)
+    def _segment(t, a, exp, fs):
+        n = np.empty(len(t), dtype=np.int64)
+        for i in range(len(t)):
+            n[i] = round(t[i] * fs)
+        y = np.empty(np.sum(n))
+        k = 0
+        for i in range(len(t)):
+            # a[i] + (a[i + 1] - a[i]) * x ** exp[i], x = linspace(0, 1, n)
+            if n[i] == 1:
+                y[k] = a[i]
+            elif n[i] > 1:
+                delta = a[i + 1] - a[i]
+                if exp[i] == 1.:
+                    step = delta / (n[i] - 1)
+                    for j in range(n[i] - 1):
+                        y[k + j] = a[i] + j * step
+                else:
+                    for j in range(n[i] - 1):
+                        y[k + j] = a[i] + delta * (j / (n[i] - 1)) ** exp[i]
+                y[k + n[i] - 1] = a[i + 1]
+            k += n[i]
         return y
 
 
@@ -61,19 +232,14 @@ class Envelope(UnipolarController):
         self.contour = contour
         self.reactive = reactive
         self.lazy = lazy
-        self._ndarray = np.zeros(len(kntxt()))
-        val = 0
-        idx = 0
-        for e in self.pattern.get_events():
-            nsamples = e.get_nsamples()
-            if not e.get_idle():
-                c = self.contour.render(e)
-                self._ndarray[idx: idx + len(c)] = c
-                val = c[-1]
-            else:
-                if not reactive:
-                    self._ndarray[idx: idx + nsamples] = val
-            idx += nsamples
+        self._ndarray = cached(
+            self._render, 'Envelope', contour, pattern, reactive
+        )
+
+    def _render(self):
+        ndarray = kntxt().allocate(len(kntxt()))
+        self.contour.render_pattern(ndarray, self.pattern, self.reactive)
+        return ndarray
 
 
 class FMEnvelope(Envelope):
@@ -87,7 +253,7 @@ class FMEnvelope(Envelope):
                     't': [0.],
                     'exp': [1.],
                 },
-                sustain=lambda e: e.get_f(),
+                sustain='f',
                 tail={
                     'a': [0., 0.],
                     't': [0.],
@@ -109,7 +275,7 @@ class PMEnvelope(Envelope):
                     't': [0.],
                     'exp': [1.],
                 },
-                sustain=lambda e: e.get_p(),
+                sustain='p',
                 tail={
                     'a': [0., 0.],
                     't': [0.],
@@ -131,7 +297,7 @@ class AMEnvelope(Envelope):
                     't': [0.],
                     'exp': [1.],
                 },
-                sustain=lambda e: e.get_a(),
+                sustain='a',
                 tail={
                     'a': [0., 0.],
                     't': [0.],
@@ -157,7 +323,7 @@ class DeltaEnvelope(Envelope):
                     't': [float(a), float(d)],
                     'exp': [1., 1.],
                 },
-                sustain=lambda e: 0.,
+                sustain=0.,
                 tail={
                     'a': [0., 0.],
                     't': [0.],
@@ -185,7 +351,7 @@ class ADSREnvelope(Envelope):
                     't': [float(a), float(d)],
                     'exp': [1., 1.],
                 },
-                sustain=lambda e: float(s),
+                sustain=float(s),
                 tail={
                     'a': [float(s), 0.],
                     't': [float(r)],
@@ -1,8 +1,16 @@
 from quantizer.kernel.kontext import kntxt
-from quantizer.stream import Stream
+from quantizer.kernel.util import (
+    Array, Callable, Dict, Integer, Scalar, Sequence, Tuple, BLOCKSIZE,
+    db2mag
+)
+from quantizer.kernel.waveform import Controller, Waveform
+from quantizer.controller import cast, constant, window
+from quantizer.stream import Stream, MonoStream, StereoStream, MultiStream
 from abc import ABC, abstractmethod
 from numba import jit
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.fft import next_fast_len, rfft, rfftfreq, irfft
 from scipy.signal import fftconvolve, butter
 
 
@@ -11,16 +19,64 @@ class FX(ABC):
     def patch(self, stream: Stream) -> Stream:
         raise RuntimeError
 
+    def process(self, block: Array) -> Array:
+        """
+        Stateful processing of one block; consecutive calls on consecutive
+        blocks of a stream are equivalent to one call on the whole stream.
+        """
+        raise RuntimeError
+
+    def reset(self) -> None:
+        """
+        Reset of the state carried between blocks.
+        """
+        return None
+
 
 class MonoFX(FX):
-    pass
+    """
+    Effects which process every channel independently with the same
+    settings. Streams of shape (..., nsamples) -- mono, stereo or multi --
+    are processed in a single call on their (nchannels, nsamples) view,
+    and the result has the type and shape of the input stream.
+    """
+
+    def patch(self, stream: Stream) -> Stream:
+        # a patch renders the whole stream from a clean state
+        self.reset()
+        return self.restream(stream, self.process(stream.get_ndarray()))
+
+    @staticmethod
+    def channels(block: Array) -> Array:
+        return block.reshape(-1, block.shape[-1])
+
+    @staticmethod
+    def precision(block: Array) -> np.dtype:
+        """
+        Output dtype for block: effects keep the floating point precision
+        of their input (and promote integer input), their state and
+        accumulators are float64.
+        """
+        return np.result_type(block.dtype, np.float32)
+
+    @staticmethod
+    def restream(stream: Stream, ndarray: Array) -> Stream:
+        if isinstance(stream, (MonoStream, StereoStream, MultiStream)):
+            return type(stream)(ndarray)
+        return Stream(ndarray)
 
 
 class StereoFX(FX):
+    """
+    Effects which couple the two channels of a (2, nsamples) stream.
+    """
     pass
 
 
 class MultiFX(FX):
+    """
+    Effects which couple the channels of a (..., nsamples) stream.
+    """
     pass
 
 
@@ -37,11 +93,287 @@ class TemporalMonoFX(MonoFX, TemporalFX):
 
 
 class SpectralMonoFX(MonoFX, SpectralFX):
-    pass
+    """
+    Short-time Fourier transform engine: frames of nfft samples every hop
+    samples are weighted by a square-root Hann window, transformed with
+    one batched rfft, modified in place by transform() and resynthesized
+    by irfft and overlap-add. Frames are processed in groups of at most
+    nframes through a preallocated buffer, so memory is bounded by the
+    block size. Output is delayed by latency = nfft samples in process();
+    patch() compensates for it.
+    """
+
+    _windows: Dict = dict()
+
+    def __init__(
+        self,
+        nfft: Integer = 2048,
+        hop: Integer = None,
+        nframes: Integer = 64,
+    ):
+        """
+        :param nfft: frame size
+        :param hop: frame advance, a divisor of nfft (default nfft / 4)
+        :param nframes: number of frames transformed per batch
+        """
+        if not hop:
+            hop = nfft // 4
+        assert nfft % hop == 0
+        self.nfft = nfft
+        self.hop = hop
+        self.nframes = nframes
+        self.latency = nfft
+        self.analysis, self.synthesis = self.windows(nfft, hop)
+        self.f = rfftfreq(nfft, 1 / kntxt().fs)
+        self.reset()
+
+    @staticmethod
+    def windows(nfft: Integer, hop: Integer) -> Tuple:
+        """
+        Square-root periodic Hann analysis window and the synthesis window
+        scaled for perfect reconstruction at the given hop.
+        """
+        key = (nfft, hop)
+        if key not in SpectralMonoFX._windows:
+            w = np.sqrt(0.5 - 0.5 * np.cos(2 * np.pi * np.arange(nfft) / nfft))
+            ws = w * hop / np.sum(w * w)
+            w.flags.writeable = False
+            ws.flags.writeable = False
+            SpectralMonoFX._windows[key] = (w, ws)
+        return SpectralMonoFX._windows[key]
+
+    @abstractmethod
+    def transform(self, spectrum: Array) -> Array:
+        """
+        In place modification of a batch of spectra.
+
+        :param spectrum: (nchannels, nframes, nfft // 2 + 1)
+        :return: spectrum
+        """
+        raise RuntimeError
+
+    def patch(self, stream: Stream) -> Stream:
+        s = stream.get_ndarray()
+        self.reset()
+        y = self.process(s)[..., self.latency:]
+        y = np.concatenate(
+            [y, self.process(
+                np.zeros(s.shape[:-1] + (self.latency,), dtype=s.dtype)
+            )],
+            axis=-1,
+        )
+        self.reset()
+        return self.restream(stream, y)
+
+    def process(self, block: Array) -> Array:
+        channels = self.channels(block)
+        nchannels, nsamples = channels.shape
+        overlap = self.nfft - self.hop
+        if self.pending is None or len(self.pending) != nchannels:
+            self.pending = np.zeros((nchannels, overlap))
+            self.tail = np.zeros((nchannels, overlap))
+            self.queue = np.zeros((nchannels, self.hop))
+            self.buffer = np.empty((nchannels, self.nframes, self.nfft))
+        data = np.concatenate([self.pending, channels], axis=-1)
+        total = max(0, (data.shape[-1] - self.nfft) // self.hop + 1)
+        queue = [self.queue]
+        if total:
+            frames = sliding_window_view(data, self.nfft, axis=-1)
+            frames = frames[:, ::self.hop]
+        for i in range(0, total, self.nframes):
+            n = min(self.nframes, total - i)
+            buffer = self.buffer[:, :n]
+            np.multiply(frames[:, i: i + n], self.analysis, out=buffer)
+            spectrum = self.transform(rfft(buffer, axis=-1))
+            y = irfft(spectrum, self.nfft, axis=-1)
+            y *= self.synthesis
+
+            # overlap-add of the frames, hop samples at a time
+            r = self.nfft // self.hop
+            acc = np.zeros((nchannels, n - 1 + r, self.hop))
+            acc.reshape(nchannels, -1)[:, :overlap] += self.tail
+            y = y.reshape(nchannels, n, r, self.hop)
+            for j in range(r):
+                acc[:, j: j + n] += y[:, :, j]
+            acc = acc.reshape(nchannels, -1)
+            queue.append(acc[:, :n * self.hop])
+            self.tail = acc[:, n * self.hop:]
+        self.pending = data[:, total * self.hop:]
+        queue = np.concatenate(queue, axis=-1)
+        self.queue = queue[:, nsamples:]
+        y = queue[:, :nsamples].astype(self.precision(block), copy=False)
+        return y.reshape(block.shape)
+
+    def reset(self) -> None:
+        self.pending = None
+        self.tail = None
+        self.queue = None
+        self.buffer = None
+        return None
+
+
+class SpectralGate(SpectralMonoFX):
+    def __init__(
+        self,
+        threshold: Scalar = -60,
+        nfft: Integer = 2048,
+        hop: Integer = None,
+    ):
+        """
+        :param threshold: bins whose amplitude is below threshold [dBFS]
+            are muted
+        """
+        super().__init__(nfft, hop)
+        # amplitude of a full scale sinusoid in its bin
+        self.threshold = db2mag(threshold) * np.sum(self.analysis) / 2
+
+    def transform(self, spectrum: Array) -> Array:
+        spectrum[np.abs(spectrum) < self.threshold] = 0
+        return spectrum
+
+
+class SpectralEqualizer(SpectralMonoFX):
+    def __init__(
+        self,
+        curve: (Callable, Sequence),
+        nfft: Integer = 2048,
+        hop: Integer = None,
+    ):
+        """
+        :param curve: gain [dB] as a function of frequency [Hz], or a
+            sequence of (frequency, gain) breakpoints, interpolated on a
+            logarithmic frequency axis
+        """
+        super().__init__(nfft, hop)
+        if callable(curve):
+            gain = np.asarray(curve(self.f), dtype=np.float64)
+        else:
+            f, g = np.asarray(sorted(curve), dtype=np.float64).T
+            gain = np.interp(
+                np.log2(np.maximum(self.f, 1e-3)),
+                np.log2(np.maximum(f, 1e-3)),
+                g,
+            )
+        self.gain = db2mag(np.broadcast_to(gain, self.f.shape))
+
+    def transform(self, spectrum: Array) -> Array:
+        spectrum *= self.gain
+        return spectrum
+
+
+class ConvolutionReverb(TemporalMonoFX):
+    def __init__(
+        self,
+        ir: (Array, Stream),
+        mix: Scalar = 1.,
+        blocksize: Integer = BLOCKSIZE,
+    ):
+        """
+        Uniformly partitioned convolution with an impulse response: the
+        response is cut into partitions of blocksize samples, each input
+        block is transformed once into a frequency-domain delay line, and
+        every output block is the sum of the delay line weighted by the
+        partition spectra (overlap-save). Memory and latency depend on
+        blocksize only; process() delays its output by latency =
+        blocksize samples, patch() compensates for it.
+
+        :param ir: impulse response
+        :param mix: ratio of the convolved (wet) signal in the output
+        :param blocksize: partition size
+        """
+        if isinstance(ir, Waveform):
+            ir = ir.get_ndarray()
+        self.mix = mix
+        self.blocksize = blocksize
+        self.latency = blocksize
+        self.n = len(ir)
+        npartitions = -(-len(ir) // blocksize)
+        partitions = np.zeros((npartitions, 2 * blocksize))
+        partitions[:, :blocksize].flat[:len(ir)] = ir
+        self.spectra = rfft(partitions, axis=-1)
+        self.reset()
+
+    def patch(self, stream: Stream) -> Stream:
+        s = stream.get_ndarray()
+        flush = np.zeros(
+            s.shape[:-1] + (self.n - 1 + self.latency,), dtype=s.dtype
+        )
+        self.reset()
+        y = np.concatenate(
+            [self.process(s), self.process(flush)], axis=-1
+        )[..., self.latency:]
+        self.reset()
+        return self.restream(stream, y)
+
+    def process(self, block: Array) -> Array:
+        channels = self.channels(block)
+        nchannels, nsamples = channels.shape
+        b = self.blocksize
+        p = len(self.spectra)
+        if self.pending is None or len(self.pending) != nchannels:
+            self.pending = np.zeros((nchannels, 0))
+            self.queue = np.zeros((nchannels, b))
+            self.frame = np.zeros((nchannels, 2 * b))
+            # delay line stored twice, so that the p most recent spectra
+            # are always the contiguous slice [k, k + p)
+            self.fdl = np.zeros(
+                (nchannels, 2 * p, b + 1), dtype=np.complex128
+            )
+            self.k = 0
+        data = np.concatenate([self.pending, channels], axis=-1)
+        nblocks = data.shape[-1] // b
+        queue = [self.queue]
+        for i in range(nblocks):
+            x = data[:, i * b: (i + 1) * b]
+            self.frame[:, :b] = self.frame[:, b:]
+            self.frame[:, b:] = x
+            self.k = (self.k - 1) % p
+            self.fdl[:, self.k] = self.fdl[:, self.k + p] = rfft(
+                self.frame, axis=-1
+            )
+            spectrum = np.einsum(
+                'cpk,pk->ck', self.fdl[:, self.k: self.k + p], self.spectra
+            )
+            y = irfft(spectrum, 2 * b, axis=-1)[:, b:]
+            queue.append(self.mix * y + (1 - self.mix) * x)
+        self.pending = data[:, nblocks * b:]
+        queue = np.concatenate(queue, axis=-1)
+        self.queue = queue[:, nsamples:]
+        y = queue[:, :nsamples].astype(self.precision(block), copy=False)
+        return y.reshape(block.shape)
+
+    def reset(self) -> None:
+        self.pending = None
+        self.queue = None
+        self.frame = None
+        self.fdl = None
+        return None
 
 
 class SincFilter(MonoFX):
-    def __init__(self, f=440, bandwidth=440, mode="lp"):
+
+    _kernels: Dict = dict()
+
+    def __init__(
+        self,
+        f: (Scalar, Array, Controller) = 440,
+        bandwidth=440,
+        mode="lp",
+        blocksize: Integer = None,
+    ):
+        """
+        :param f: cutoff frequency; a controller sweeps the cutoff, the
+            kernel then follows it once per block of blocksize samples
+        :param bandwidth: transition bandwidth
+        :param blocksize: partition size of the overlap-add convolution
+        """
+        self.f = None
+        if isinstance(f, Waveform) or np.ndim(f):
+            self.f = cast(f)
+            f = window(self.f, 0, 1)[0]
+            if constant(self.f) is not None:
+                self.f = None
+        f = float(f)
         self.fc = f / kntxt().fs * 2
         self.bw = bandwidth / kntxt().fs
         self.m = int(np.round(4 / self.bw))
@@ -49,56 +381,232 @@ class SincFilter(MonoFX):
             self.n = self.m
         else:
             self.n = self.m + 1
+        self.h = self.kernel()
 
-    def patch(self, stream: Stream) -> Stream:
-        s = stream.get_ndarray()
+        # overlap-add: each block of up to blocksize samples is convolved
+        # by a single rfft/irfft pair of size nfft with the kernel spectrum
+        if not blocksize:
+            blocksize = max(BLOCKSIZE, self.n)
+        self.blocksize = blocksize
+        self.nfft = next_fast_len(blocksize + self.n - 1, real=True)
+        self.spectrum = rfft(self.h, self.nfft)
+        self.overlap = None
+        self.partition = None
+        self.idx = 0
+
+    def kernel(self) -> Array:
+        """
+        Blackman windowed sinc kernel, computed once per (fc, bw) and
+        shared read-only by all filters with the same parameters.
+        """
+        key = (self.fc, self.bw)
+        if key not in SincFilter._kernels:
+            h = self._design(self.fc)
+            h.flags.writeable = False
+            SincFilter._kernels[key] = h
+        return SincFilter._kernels[key]
+
+    def _design(self, fc):
         x = np.arange(self.n)
         w = (
             0.42
             - 0.5 * np.cos(2 * np.pi * x / self.m)
             + 0.08 * np.cos(4 * np.pi * x / self.m)
         )
-        h = np.sinc(self.fc * (x - self.m / 2))
+        h = np.sinc(fc * (x - self.m / 2))
         h *= w
         h /= np.sum(h)
-        s = fftconvolve(s, h)
-        return Stream(s)
+        return h
+
+    def patch(self, stream: Stream) -> Stream:
+        s = stream.get_ndarray()
+        if self.f is None:
+            h = self.h.astype(self.precision(s))
+            h = h.reshape((1,) * (s.ndim - 1) + (-1,))
+            s = fftconvolve(s, h, axes=-1)
+        else:
+            self.reset()
+            s = np.concatenate([
+                self.process(s),
+                self.overlap.astype(self.precision(s)).reshape(
+                    s.shape[:-1] + (-1,)
+                ),
+            ], axis=-1)
+        return self.restream(stream, s)
+
+    def process(self, block: Array) -> Array:
+        """
+        Overlap-add convolution: the output has the length of the block
+        and the convolution tail is carried over to the next block.
+        Partitions lie on a grid of blocksize samples from the start of
+        the stream, whatever the size of the blocks, so that a swept
+        kernel changes at the same samples however the stream is split.
+        """
+        channels = self.channels(block)
+        if self.overlap is None or len(self.overlap) != len(channels):
+            self.overlap = np.zeros((len(channels), self.n - 1))
+        y = np.empty(channels.shape, dtype=self.precision(block))
+        i = 0
+        while i < channels.shape[-1]:
+            length = min(
+                self.blocksize - self.idx % self.blocksize,
+                channels.shape[-1] - i,
+            )
+            x = channels[..., i: i + length]
+            spectrum = self.spectrum
+            if self.f is not None:
+                spectrum = self._sweep(self.idx // self.blocksize)
+            acc = irfft(rfft(x, self.nfft) * spectrum, self.nfft)
+            acc = acc[..., :length + self.n - 1]
+            acc[..., :self.n - 1] += self.overlap
+            y[..., i: i + length] = acc[..., :length]
+            self.overlap = acc[..., length:]
+            self.idx += length
+            i += length
+        return y.reshape(block.shape)
+
+    def _sweep(self, k):
+        # kernel spectrum of partition k, designed from the cutoff at its
+        # first sample and kept while blocks fall into the partition
+        if self.partition is None or self.partition[0] != k:
+            fc = window(self.f, k * self.blocksize, k * self.blocksize + 1)
+            self.partition = k, rfft(
+                self._design(fc[0] / kntxt().fs * 2), self.nfft
+            )
+        return self.partition[1]
+
+    def reset(self) -> None:
+        self.overlap = None
+        self.partition = None
+        self.idx = 0
+        return None
 
 
 class ButterworthFilter(MonoFX):
-    def __init__(self, f=440, order=4):
-        fc = f / kntxt().fs * 2
-        b, a = butter(order, fc)
-        self.b = b
-        self.a = a
-        self.dx = [0.] * order
-        self.dy = [0.] * order
+    def __init__(
+        self,
+        f: (Scalar, Array, Controller) = 440,
+        order: Integer = 4,
+        hop: Integer = 1,
+    ):
+        """
+        :param f: cutoff frequency; a controller sweeps the cutoff, the
+            coefficients then follow it every hop samples
+        :param order: filter order
+        :param hop: number of samples between coefficient updates
+        """
+        self.f = None
+        self.hop = hop
+        if isinstance(f, Waveform) or np.ndim(f):
+            self.f = cast(f)
+            if constant(self.f) is not None:
+                f, self.f = constant(self.f), None
+        if self.f is None:
+            fc = float(f) / kntxt().fs * 2
+            self.sos = butter(order, fc, output='sos')
+        else:
+            self.sos = None
+        # Q factor of each section of the bilinear transformed analog
+        # prototype; 0 marks the first-order section of an odd order
+        self.q = np.zeros((order + 1) // 2)
+        k = np.arange(1, order // 2 + 1)
+        theta = (2 * k - 1) * np.pi / (2 * order)
+        self.q[:order // 2] = 1 / (2 * np.sin(theta))
+        self.ba = np.zeros((len(self.q), 5))
+        self.zi = None
+        self.idx = 0
 
-    def patch(self, stream: Stream) -> Stream:
-        x = stream.get_ndarray()
-        y = np.zeros(len(x))
-        y = self._patch(x, y, self.dx, self.dy, self.b, self.a)
-        return Stream(y)
+    def process(self, block: Array) -> Array:
+        """
+        :param block: (..., nsamples); all channels are filtered in one
+            call, each with its own state
+        :return: filtered block
+        """
+        dtype = self.precision(block)
+        # the kernels read the input and write the output in one type
+        x = np.ascontiguousarray(self.channels(block), dtype=dtype)
+        if self.zi is None or self.zi.shape[0] != x.shape[0]:
+            self.zi = np.zeros((x.shape[0], len(self.q), 2))
+        y = np.empty(x.shape, dtype=dtype)
+        if self.f is None:
+            self._patch(x, y, self.sos, self.zi)
+        else:
+            f = window(self.f, self.idx, self.idx + x.shape[1])
+            self._sweep(
+                x, y, f, kntxt().fs, self.q, self.ba, self.zi, self.hop,
+                self.idx,
+            )
+        self.idx += x.shape[1]
+        return y.reshape(block.shape)
+
+    def reset(self) -> None:
+        self.zi = None
+        self.idx = 0
+        return None
+
+    @staticmethod
+    @jit(nopython=True, nogil=True, cache=True)
+    def _patch(x, y, sos, zi):
+        # cascade of second-order sections, transposed direct form II
+        for c in range(x.shape[0]):
+            for s in range(sos.shape[0]):
+                b0, b1, b2 = sos[s, 0], sos[s, 1], sos[s, 2]
+                a1, a2 = sos[s, 4], sos[s, 5]
+                z0, z1 = zi[c, s, 0], zi[c, s, 1]
+                src = x if s == 0 else y
+                for i in range(x.shape[1]):
+                    v = src[c, i]
+                    w = b0 * v + z0
+                    z0 = b1 * v - a1 * w + z1
+                    z1 = b2 * v - a2 * w
+                    # a decaying state would end up in subnormal numbers,
+                    # which are orders of magnitude slower to compute with
+                    if abs(z0) < 1e-30 and abs(z1) < 1e-30:
+                        z0 = z1 = 0.
+                    y[c, i] = w
+                zi[c, s, 0], zi[c, s, 1] = z0, z1
+        return y
 
     @staticmethod
-    @jit(nopython=True, cache=True)
-    def _patch(x, y, dx, dy, b, a):
-        for i in range(len(x)):
-            sigma_bx = b[0] * x[i]
-            for j in range(1, len(b)):
-                sigma_bx += b[j] * dx[j - 1]
-            sigma_ay = 0.
-            for j in range(1, len(a)):
-                sigma_ay += a[j] * dy[j - 1]
-            y[i] = (sigma_bx - sigma_ay) / a[0]
-            for j in range(1, len(dx)):
-                dx[-1 * j] = dx[-1 * j - 1]
-            dx[0] = x[i]
-            for j in range(1, len(dy)):
-                dy[-1 * j] = dy[-1 * j - 1]
-            dy[0] = y[i]
+    @jit(nopython=True, nogil=True, cache=True)
+    def _sweep(x, y, f, fs, q, ba, zi, hop, offset):
+        # as _patch, with the sections redesigned from the cutoff f[i]
+        # every hop samples (bilinear transform with prewarping); the
+        # current coefficients ba are part of the state
+        b = ba[:, :3]
+        a = ba[:, 3:]
+        for i in range(x.shape[1]):
+            if (offset + i) % hop == 0:
+                fc = min(max(f[i], 1e-6 * fs), 0.4999 * fs)
+                k = np.tan(np.pi * fc / fs)
+                for s in range(len(q)):
+                    if q[s] > 0:
+                        norm = 1 / (1 + k / q[s] + k * k)
+                        b[s, 0] = k * k * norm
+                        b[s, 1] = 2 * b[s, 0]
+                        b[s, 2] = b[s, 0]
+                        a[s, 0] = 2 * (k * k - 1) * norm
+                        a[s, 1] = (1 - k / q[s] + k * k) * norm
+                    else:
+                        norm = 1 / (1 + k)
+                        b[s, 0] = k * norm
+                        b[s, 1] = b[s, 0]
+                        a[s, 0] = (k - 1) * norm
+            for c in range(x.shape[0]):
+                v = x[c, i]
+                for s in range(len(q)):
+                    w = b[s, 0] * v + zi[c, s, 0]
+                    zi[c, s, 0] = b[s, 1] * v - a[s, 0] * w + zi[c, s, 1]
+                    zi[c, s, 1] = b[s, 2] * v - a[s, 1] * w
+                    if abs(zi[c, s, 0]) < 1e-30 and abs(zi[c, s, 1]) < 1e-30:
+                        zi[c, s, 0] = zi[c, s, 1] = 0.
+                    v = w
+                y[c, i] = v
         return y
 
 
 SF = SincFilter
 BWF = ButterworthFilter
+SG = SpectralGate
+SEQ = SpectralEqualizer
+CR = ConvolutionReverb
@@ -0,0 +1,149 @@
+from quantizer.kernel.util import (
+    Array, Callable, Dict, Integer, List, Sequence, String
+)
+from quantizer.kernel.waveform import Controller, Stream, Waveform
+from concurrent.futures import (
+    FIRST_COMPLETED, ThreadPoolExecutor, wait
+)
+
+
+class Graph:
+    def __init__(self):
+        """
+        Render dependency graph of a patch. Nodes are Waveform producers,
+        callables of the rendered waveforms of their inputs:
+
+            g = Graph()
+            g.add("lfo", lambda: Oscillator(f=5.))
+            g.add("a", lambda lfo: Oscillator(f=220 + 10 * lfo), ["lfo"])
+            g.add("b", lambda lfo: Oscillator(f=330 + 10 * lfo), ["lfo"])
+            a, b = g.render(["a", "b"]).values()
+
+        Every node is rendered once, however many consumers it has, and
+        its samples are released as soon as its last consumer is done
+        (unless it is an output), so peak memory follows the width of
+        the graph rather than its number of nodes.
+        """
+        self.producers = dict()
+        self.inputs = dict()
+
+    def add(
+        self,
+        name: String,
+        producer: Callable,
+        inputs: Sequence = (),
+    ) -> String:
+        """
+        :param name: unique node name
+        :param producer: callable of the input waveforms, in order of
+            inputs, returning a Waveform (or an ndarray)
+        :param inputs: names of nodes added before, which keeps the graph
+            acyclic
+        :return: name
+        """
+        if name in self.producers:
+            raise RuntimeError(f"node {name!r} exists")
+        for i in inputs:
+            if i not in self.producers:
+                raise RuntimeError(f"unknown input {i!r} of node {name!r}")
+        self.producers[name] = producer
+        self.inputs[name] = list(inputs)
+        return name
+
+    def sinks(self) -> List:
+        consumed = {i for inputs in self.inputs.values() for i in inputs}
+        return [name for name in self.producers if name not in consumed]
+
+    def order(self, outputs: Sequence = None) -> List:
+        """
+        Topological order of the nodes outputs depend on (all sinks if
+        omitted).
+        """
+        if outputs is None:
+            outputs = self.sinks()
+        needed = set()
+        stack = list(outputs)
+        while stack:
+            name = stack.pop()
+            if name not in needed:
+                needed.add(name)
+                stack.extend(self.inputs[name])
+        # nodes are added after their inputs
+        return [name for name in self.producers if name in needed]
+
+    def render(
+        self,
+        outputs: Sequence = None,
+        workers: Integer = None,
+    ) -> Dict:
+        """
+        :param outputs: names of the nodes to render (all sinks if
+            omitted); only the nodes they depend on are rendered
+        :param workers: render nodes whose inputs are ready on a thread
+            pool of this size (serially if omitted)
+        :return: rendered waveforms of outputs by name
+        """
+        if outputs is None:
+            outputs = self.sinks()
+        order = self.order(outputs)
+        consumers = {name: [] for name in order}
+        for name in order:
+            for i in set(self.inputs[name]):
+                consumers[i].append(name)
+        pending = {name: len(set(self.inputs[name])) for name in order}
+        refcount = {name: len(consumers[name]) for name in order}
+        results = dict()
+
+        # ready nodes are taken last in, first out: rendering depth first
+        # lets intermediates be released early
+        ready = [name for name in reversed(order) if not pending[name]]
+
+        def done(name, waveform):
+            results[name] = waveform
+            for i in set(self.inputs[name]):
+                refcount[i] -= 1
+                if not refcount[i] and i not in outputs:
+                    del results[i]
+            for c in reversed(consumers[name]):
+                pending[c] -= 1
+                if not pending[c]:
+                    ready.append(c)
+
+        if not workers:
+            while ready:
+                name = ready.pop()
+                done(name, self._render(name, results))
+        else:
+            with ThreadPoolExecutor(workers) as executor:
+                futures = dict()
+                while ready or futures:
+                    while ready:
+                        name = ready.pop()
+                        futures[executor.submit(
+                            self._render, name, results
+                        )] = name
+                    finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        done(futures.pop(future), future.result())
+        return {name: results[name] for name in outputs}
+
+    def _render(self, name, results):
+        y = self.producers[name](*[results[i] for i in self.inputs[name]])
+        return Graph.detach(y)
+
+    @staticmethod
+    def detach(y: (Waveform, Array)) -> Waveform:
+        """
+        Waveform holding only the samples of y: a rendered Oscillator, for
+        instance, would otherwise keep its input controllers alive.
+        """
+        if isinstance(y, Array):
+            return Waveform(y)
+        elif isinstance(y, Controller):
+            return Controller(y.get_ndarray())
+        elif isinstance(y, Stream):
+            return type(y)(y.get_ndarray())
+        elif isinstance(y, Waveform):
+            return Waveform(y.get_ndarray())
+        else:
+            raise RuntimeError
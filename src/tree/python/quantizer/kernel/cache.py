@@ -0,0 +1,156 @@
+from quantizer.kernel.util import Array, Callable, Integer, String
+from collections import OrderedDict
+import hashlib
+import numpy as np
+import os
+import threading
+
+
+class RenderCache:
+    def __init__(
+        self,
+        nbytes: Integer = 2 ** 30,
+        directory: String = None,
+    ):
+        """
+        Content-addressed cache of rendered ndarrays: a render is keyed by
+        the digest of everything it depends on (see fingerprint). Entries
+        are kept in a least recently used memory tier bounded by nbytes
+        and, if a directory is given, in an on-disk tier of .npy files
+        which are memory-mapped when they are loaded again.
+
+        :param nbytes: size bound of the memory tier
+        :param directory: location of the on-disk tier
+        """
+        self.nbytes = nbytes
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(*parts) -> String:
+        h = hashlib.blake2b(digest_size=20)
+        for part in parts:
+            fingerprint(part, h)
+        return h.hexdigest()
+
+    def get(self, key: String) -> Array:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+        if self.directory:
+            file_path = self._file_path(key)
+            if os.path.exists(file_path):
+                ndarray = np.load(file_path, mmap_mode='r')
+                self._insert(key, ndarray)
+                with self._lock:
+                    self.hits += 1
+                return ndarray
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: String, ndarray: Array) -> Array:
+        ndarray.flags.writeable = False
+        self._insert(key, ndarray)
+        if self.directory:
+            file_path = self._file_path(key)
+            if not os.path.exists(file_path):
+                # written under a temporary name, so that a concurrent
+                # reader never sees a partial file
+                tmp_path = f"{file_path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    np.save(f, ndarray)
+                os.replace(tmp_path, file_path)
+        return ndarray
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+        return None
+
+    def _insert(self, key, ndarray):
+        with self._lock:
+            if key in self._entries:
+                return None
+            self._entries[key] = ndarray
+            if not isinstance(ndarray, np.memmap):
+                self._size += ndarray.nbytes
+            while self._size > self.nbytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                if not isinstance(evicted, np.memmap):
+                    self._size -= evicted.nbytes
+        return None
+
+    def _file_path(self, key):
+        return os.path.join(self.directory, f"{key}.npy")
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def fingerprint(obj, h) -> None:
+    """
+    Feeds a canonical description of obj into the hash h. Objects describe
+    themselves by a fingerprint() method returning the parts they depend
+    on; objects without a canonical description (e.g. lambdas) raise
+    TypeError and are not cached.
+    """
+    if obj is None or isinstance(obj, (bool, int, float, str)):
+        h.update(f"{type(obj).__name__}:{obj!r};".encode())
+    elif isinstance(obj, np.generic):
+        fingerprint(obj.item(), h)
+    elif isinstance(obj, np.ndarray):
+        h.update(f"ndarray:{obj.dtype}:{obj.shape};".encode())
+        if obj.dtype.hasobject:
+            fingerprint(obj.tolist(), h)
+        elif obj.size and 0 in obj.strides:
+            # a broadcast view is described by its distinct samples only
+            h.update(b"broadcast;")
+            index = tuple(slice(None) if s else slice(1) for s in obj.strides)
+            fingerprint(obj[index].copy(), h)
+        else:
+            h.update(np.ascontiguousarray(obj).data)
+    elif isinstance(obj, (tuple, list)):
+        h.update(f"{type(obj).__name__}:{len(obj)};".encode())
+        for o in obj:
+            fingerprint(o, h)
+    elif isinstance(obj, dict):
+        h.update(f"dict:{len(obj)};".encode())
+        for k in sorted(obj):
+            fingerprint(k, h)
+            fingerprint(obj[k], h)
+    elif hasattr(obj, "fingerprint"):
+        h.update(f"{type(obj).__qualname__};".encode())
+        fingerprint(obj.fingerprint(), h)
+    else:
+        raise TypeError(f"{type(obj).__qualname__} cannot be fingerprinted")
+    return None
+
+
+def cached(render: Callable, *parts) -> Array:
+    """
+    Result of render(), looked up in and stored to the render cache of
+    the current context (if any) under the digest of parts and the
+    context itself.
+    """
+    from quantizer.kernel.kontext import kntxt
+    cache = kntxt().cache
+    if cache is None:
+        return render()
+    try:
+        key = cache.key(kntxt(), *parts)
+    except TypeError:
+        return render()
+    ndarray = cache.get(key)
+    if ndarray is None:
+        ndarray = cache.put(key, render())
+    return ndarray
@@ -1,13 +1,22 @@
 from quantizer.kernel.util import (
-    Boolean, Integer, Scalar, Type, beats2samples, samples2beats
+    Array, Boolean, Integer, Scalar, String, Tuple, Type, beats2samples,
+    samples2beats
 )
+from quantizer.kernel.cache import RenderCache
 from quantizer.kernel.waveform import Controller
 import __main__
 from abc import ABC, abstractmethod
 import numpy as np
+import os
+import tempfile
+import weakref
 
 
 class Context:
+
+    # samples per step when filling full-length controllers
+    chunksize: Integer = 2 ** 20
+
     def __init__(
             self,
             beats: Scalar = 48,
@@ -15,9 +24,26 @@ class Context:
             fs: Integer = 44100,
             nsamples: Integer = None,
             dtype: Type = np.float32,
+            cache: RenderCache = None,
+            scratch: String = None,
     ):
+        """
+        :param dtype: sample dtype of the render graph: controllers,
+            envelopes, oscillator output, effects and the mix are kept in
+            this precision; accumulations which need more (e.g. the
+            oscillator phase integral) run in float64 internally
+        :param cache: render cache consulted by Oscillators and Envelopes
+            (renders are not cached if omitted)
+        :param scratch: directory backing the context controllers and
+            rendered waveforms with memory-mapped files instead of RAM
+        """
         self.bpm = bpm
         self.fs = fs
+        self.dtype = np.dtype(dtype)
+        self.cache = cache
+        self.scratch = scratch
+        if scratch:
+            os.makedirs(scratch, exist_ok=True)
         if nsamples:
             self.nsamples = nsamples
             self.beats = samples2beats(self.nsamples, self.bpm, self.fs)
@@ -26,28 +52,61 @@ class Context:
             self.nsamples = beats2samples(self.beats, self.bpm, self.fs)
 
         # axis
-        x = np.arange(self.nsamples, dtype=dtype)
+        x = self.allocate(self.nsamples, dtype=dtype)
+        for i in range(0, self.nsamples, Context.chunksize):
+            j = min(i + Context.chunksize, self.nsamples)
+            x[i: j] = np.arange(i, j)
         self.x = Controller(x)
 
         # time
-        t = np.arange(self.nsamples, dtype=dtype)
-        t /= self.fs
+        t = self.allocate(self.nsamples, dtype=dtype)
+        for i in range(0, self.nsamples, Context.chunksize):
+            j = min(i + Context.chunksize, self.nsamples)
+            np.divide(x[i: j], self.fs, out=t[i: j])
         self.t = Controller(t)
 
-        # frequency
-        f = np.zeros(self.nsamples, dtype=dtype)
-        f.fill(440)
-        self.f = Controller(f)
+        # frequency, phase and amplitude are constant: read-only, 0-stride
+        # views which take no memory and are recognized as scalars
+        self.f = Controller(self._constant(440, dtype))
+        self.p = Controller(self._constant(0, dtype))
+        self.a = Controller(self._constant(1, dtype))
+
+    def allocate(self, shape: (Integer, Tuple), dtype: Type = None) -> Array:
+        """
+        Zero-initialized buffer: an np.memmap of a temporary file in the
+        scratch directory if there is one, an ndarray otherwise. The file
+        is released with the last reference to the buffer: on POSIX it is
+        unlinked right away (the mapping keeps it alive), elsewhere an
+        open file cannot be removed and it is deleted once the mapping
+        is closed.
+
+        :param shape: shape of the buffer
+        :param dtype: data type (default: the sample dtype of the context)
+        """
+        if dtype is None:
+            dtype = self.dtype
+        if not self.scratch or np.prod(shape) == 0:
+            return np.zeros(shape, dtype=dtype)
+        fd, file_path = tempfile.mkstemp(suffix=".dat", dir=self.scratch)
+        os.close(fd)
+        try:
+            mm = np.memmap(file_path, dtype=dtype, mode="w+", shape=shape)
+        except BaseException:
+            os.unlink(file_path)
+            raise
+        if os.name == "posix":
+            os.unlink(file_path)
+        else:
+            # views share the mmap object, which closes the file when
+            # the last of them is gone
+            weakref.finalize(mm.base, os.unlink, file_path)
+        return mm
 
-        # phase
-        p = np.zeros(self.nsamples, dtype=dtype)
-        p.fill(0)
-        self.p = Controller(p)
+    def _constant(self, scalar, dtype):
+        return np.broadcast_to(np.asarray(scalar, dtype=dtype), self.nsamples)
 
-        # amplitude
-        a = np.zeros(self.nsamples, dtype=dtype)
-        a.fill(1)
-        self.a = Controller(a)
+    def fingerprint(self) -> Tuple:
+        return self.bpm, self.fs, self.nsamples, self.dtype.str
 
     def __len__(self):
         return len(self.x)
@@ -72,9 +131,22 @@ class Session:
             fs: Integer = 44100,
             nsamples: Integer = None,
             fork: Boolean = True,
+            cache: RenderCache = None,
+            scratch: String = None,
+            dtype: Type = np.float32,
     ):
+        """
+        :param dtype: sample dtype of the context (see Context)
+        """
         if fork:
-            setattr(__main__, "KNTXT", Context(beats, bpm, fs, nsamples))
+            setattr(
+                __main__,
+                "KNTXT",
+                Context(
+                    beats, bpm, fs, nsamples, dtype=dtype, cache=cache,
+                    scratch=scratch,
+                ),
+            )
         else:
             try:
                 getattr(__main__, "KNTXT")
@@ -82,7 +154,10 @@ class Session:
                 setattr(
                     __main__,
                     "KNTXT",
-                    Context(beats, bpm, fs, nsamples),
+                    Context(
+                        beats, bpm, fs, nsamples, dtype=dtype, cache=cache,
+                        scratch=scratch,
+                    ),
                 )
 
     @abstractmethod
@@ -0,0 +1,283 @@
+from quantizer.kernel.kontext import kntxt
+from quantizer.kernel.util import (
+    Array, Boolean, Callable, Float, Integer, Type, BLOCKSIZE
+)
+from quantizer.kernel.waveform import Waveform
+import numpy as np
+import sounddevice as sd
+import threading
+import time
+
+
+class RingBuffer:
+    def __init__(
+        self,
+        capacity: Integer,
+        channels: Integer = 1,
+        dtype: Type = np.float32,
+    ):
+        """
+        Single producer, single consumer ring of (frames, channels)
+        samples, the layout of sounddevice buffers. Reads and writes copy
+        at most two slices and never allocate.
+
+        :param capacity: number of frames
+        :param channels: number of channels
+        """
+        self.buffer = np.zeros((capacity, channels), dtype=dtype)
+        self.capacity = capacity
+        self.nread = 0
+        self.nwritten = 0
+        self.condition = threading.Condition()
+
+    def write(self, frames: Array) -> Integer:
+        """
+        :param frames: (n, channels)
+        :return: number of frames written (limited by the free space)
+        """
+        with self.condition:
+            n = min(len(frames), self.capacity - len(self))
+            self._copy(frames[:n], self.nwritten, into_ring=True)
+            self.nwritten += n
+            self.condition.notify_all()
+        return n
+
+    def read(self, out: Array) -> Integer:
+        """
+        :param out: (n, channels) destination
+        :return: number of frames read (limited by the frames available)
+        """
+        with self.condition:
+            n = min(len(out), len(self))
+            self._copy(out[:n], self.nread, into_ring=False)
+            self.nread += n
+            self.condition.notify_all()
+        return n
+
+    def wait(self, predicate: Callable, timeout: Float = None) -> Boolean:
+        """
+        Waits until predicate(ring) holds, e.g. for free space.
+        """
+        with self.condition:
+            return self.condition.wait_for(lambda: predicate(self), timeout)
+
+    def _copy(self, frames, count, into_ring):
+        i = count % self.capacity
+        n = min(len(frames), self.capacity - i)
+        if into_ring:
+            self.buffer[i: i + n] = frames[:n]
+            self.buffer[:len(frames) - n] = frames[n:]
+        else:
+            frames[:n] = self.buffer[i: i + n]
+            frames[n:] = self.buffer[:len(frames) - n]
+
+    def free(self) -> Integer:
+        return self.capacity - len(self)
+
+    def __len__(self):
+        return self.nwritten - self.nread
+
+
+class NullDevice:
+    def __init__(
+        self,
+        samplerate: Integer,
+        blocksize: Integer,
+        channels: Integer,
+        dtype: Type,
+        callback: Callable,
+        realtime: Boolean = True,
+    ):
+        """
+        Output stream without a sound card, with the interface of
+        sounddevice.OutputStream: a thread calls callback(outdata, frames,
+        time, status) for every block, paced at the sampling frequency.
+        The output is kept in self.output for inspection.
+
+        :param realtime: pace the callbacks; if not, they follow each
+            other immediately, and a Player's callback then waits for
+            its producer instead of underrunning (the play time is the
+            render time)
+        """
+        self.samplerate = samplerate
+        self.blocksize = blocksize
+        self.channels = channels
+        self.dtype = np.dtype(dtype)
+        self.callback = callback
+        self.realtime = realtime
+        self.output = []
+        self.active = False
+        self._thread = None
+
+    def start(self) -> None:
+        self.active = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self.active = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def close(self) -> None:
+        self.stop()
+
+    def _run(self):
+        period = self.blocksize / self.samplerate
+        deadline = time.perf_counter()
+        while self.active:
+            outdata = np.empty((self.blocksize, self.channels), self.dtype)
+            self.callback(outdata, self.blocksize, None, None)
+            self.output.append(outdata)
+            if self.realtime:
+                deadline += period
+                time.sleep(max(0., deadline - time.perf_counter()))
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class Player:
+    def __init__(
+        self,
+        source: (Waveform, object),
+        fs: Integer = None,
+        blocksize: Integer = BLOCKSIZE,
+        nblocks: Integer = 8,
+        channels: Integer = 1,
+        device: Callable = None,
+    ):
+        """
+        Realtime playback: a producer thread pulls blocks from source on
+        demand into a ring buffer of nblocks blocks, which the callback of
+        an output stream drains. A block the ring cannot fill in time is
+        an underrun (played as silence).
+
+        :param source: Waveform (rendered by its blocks()) or iterable of
+            (nsamples,) or (channels, nsamples) blocks
+        :param fs: sampling frequency (of the context if omitted)
+        :param blocksize: frames per callback
+        :param nblocks: ring buffer size in blocks (latency)
+        :param channels: number of output channels
+        :param device: output stream class, sounddevice.OutputStream if
+            omitted; NullDevice plays without a sound card
+        """
+        self.source = source
+        self.fs = fs or kntxt().fs
+        self.blocksize = blocksize
+        self.channels = channels
+        self.device = device
+        self.ring = RingBuffer(nblocks * blocksize, channels)
+        self.underruns = 0
+        self.xruns = 0
+        self.nframes = 0
+        self.render_seconds = 0.
+        self.min_fill = self.ring.capacity
+        self._blocking = False
+        self._error = None
+        self._exhausted = threading.Event()
+        self._finished = threading.Event()
+        self._stopped = threading.Event()
+
+    @property
+    def headroom(self) -> Float:
+        """
+        Realtime factor of the producer: seconds of audio rendered per
+        second spent rendering (> 1 keeps up with playback).
+        """
+        if not self.render_seconds:
+            return np.inf
+        return self.nframes / self.fs / self.render_seconds
+
+    def play(self, timeout: Float = None) -> None:
+        """
+        Plays the source to its end (or until stop()); the ring is filled
+        before the stream starts. An exception raised while rendering the
+        source is raised again here, once the stream is closed.
+        """
+        producer = threading.Thread(target=self._produce, daemon=True)
+        producer.start()
+        try:
+            self.ring.wait(
+                lambda ring: not ring.free() or self._exhausted.is_set(),
+                timeout,
+            )
+            device = self.device or sd.OutputStream
+            stream = device(
+                samplerate=self.fs,
+                blocksize=self.blocksize,
+                channels=self.channels,
+                dtype="float32",
+                callback=self.callback,
+            )
+            # an unpaced device waits for the producer
+            self._blocking = not getattr(stream, "realtime", True)
+            with stream:
+                self._finished.wait(timeout)
+        finally:
+            self.stop()
+            producer.join()
+        if self._error is not None:
+            raise self._error
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._finished.set()
+        with self.ring.condition:
+            self.ring.condition.notify_all()
+
+    def callback(self, outdata, frames, time_info, status) -> None:
+        if status:
+            self.xruns += 1
+        if self._blocking:
+            self.ring.wait(
+                lambda ring: len(ring) >= frames
+                or self._exhausted.is_set()
+                or self._stopped.is_set()
+            )
+        self.min_fill = min(self.min_fill, len(self.ring))
+        n = self.ring.read(outdata)
+        if n < frames:
+            outdata[n:] = 0
+            if self._exhausted.is_set():
+                if not len(self.ring):
+                    self._finished.set()
+            elif not self._blocking:
+                self.underruns += 1
+
+    def _produce(self):
+        try:
+            blocks = self.source
+            if isinstance(blocks, Waveform):
+                blocks = blocks.blocks(self.blocksize)
+            blocks = iter(blocks)
+            while not self._stopped.is_set():
+                t = time.perf_counter()
+                try:
+                    block = next(blocks)
+                except StopIteration:
+                    break
+                self.render_seconds += time.perf_counter() - t
+                frames = np.asarray(block, dtype=np.float32)
+                if frames.ndim == 1:
+                    frames = frames.reshape(-1, 1)
+                else:
+                    frames = frames.T
+                self.nframes += len(frames)
+                while len(frames) and not self._stopped.is_set():
+                    self.ring.wait(
+                        lambda ring: ring.free() or self._stopped.is_set()
+                    )
+                    frames = frames[self.ring.write(frames):]
+        except BaseException as e:
+            self._error = e
+            self.stop()
+        finally:
+            self._exhausted.set()
+            with self.ring.condition:
+                self.ring.condition.notify_all()
@@ -1,10 +1,10 @@
 import numpy as np
-from scipy.io import wavfile
 import sounddevice as sd
 from typing import Callable, Union
 from warnings import warn
 
 PI = np.pi
+BLOCKSIZE = 1024
 
 Boolean = bool
 Integer = int
@@ -51,10 +51,21 @@ def samples2beats(nsamples: Integer, bpm: Scalar, fs: Integer) -> Float:
     return nsamples * bpm * (1 / 60) * (1 / fs)
 
 
-def bounce(y: Array, file_path: String = None, fs: Integer = None) -> None:
+def bounce(
+        y: Array,
+        file_path: String = None,
+        fs: Integer = None,
+        format: String = "float32",
+) -> None:
     """
-    https://docs.scipy.org/doc/scipy/reference/generated/scipy.io.wavfile.write.html
+    Streaming WAVE export of y, (nsamples,) or (channels, nsamples), one
+    block at a time (see quantizer.kernel.wav.WaveWriter). Unlike
+    scipy.io.wavfile.write, which took (nsamples, channels), channels
+    come first, as in StereoStream and MultiStream.
+
+    :param format: sample format, "int16", "int24" or "float32"
     """
+    from quantizer.kernel.wav import WaveWriter
     if not file_path:
         file_path = "bounce.wav"
         warn(
@@ -69,7 +80,15 @@ def bounce(y: Array, file_path: String = None, fs: Integer = None) -> None:
             f"fs = {fs}",
             RuntimeWarning
         )
-    wavfile.write(file_path, fs, y.astype(np.float32))
+    y = np.asarray(y)
+    if y.ndim > 2 or y.ndim == 2 and len(y) > y.shape[-1]:
+        raise RuntimeError(
+            f"samples of shape {y.shape} are not (nsamples,) or "
+            "(channels, nsamples); transpose (nsamples, channels) input"
+        )
+    channels = 1 if y.ndim == 1 else len(y)
+    with WaveWriter(file_path, fs, channels, format) as writer:
+        writer.write_all(y)
     return None
 
 
@@ -0,0 +1,152 @@
+from quantizer.kernel.util import (
+    Array, Boolean, Dict, Integer, String, BLOCKSIZE
+)
+from quantizer.kernel.waveform import Waveform
+import numpy as np
+import struct
+
+
+class WaveWriter:
+
+    # format tag, bytes per sample, full scale of the integer formats
+    formats: Dict = {
+        "int16": (1, 2, 2 ** 15),
+        "int24": (1, 3, 2 ** 23),
+        "float32": (3, 4, None),
+    }
+
+    def __init__(
+        self,
+        file_path: String,
+        fs: Integer,
+        channels: Integer = 1,
+        format: String = "float32",
+        dither: Boolean = True,
+        seed: Integer = None,
+    ):
+        """
+        Incremental RIFF/WAVE writer: the header is written up front with
+        empty sizes, blocks are converted and appended one at a time, and
+        the sizes are patched in by close(). Memory is bounded by the
+        block size, whatever the length of the file.
+
+        :param format: sample format, "int16", "int24" or "float32"
+        :param dither: add triangular (TPDF) dither of one LSB before
+            quantizing to an integer format
+        :param seed: seed of the dither noise
+        """
+        if format not in WaveWriter.formats:
+            raise RuntimeError(f"unsupported format {format!r}")
+        if not 0 < channels < 2 ** 16:
+            raise RuntimeError(f"unsupported number of channels {channels}")
+        self.file_path = file_path
+        self.fs = fs
+        self.channels = channels
+        self.format = format
+        self.tag, self.width, self.scale = WaveWriter.formats[format]
+        self.dither = dither and self.scale is not None
+        self.rng = np.random.default_rng(seed)
+        self.nframes = 0
+        self.file = open(file_path, "wb")
+        self._header()
+
+    def write(self, block: Array) -> None:
+        """
+        :param block: (nsamples,) or (channels, nsamples) samples in
+            [-1, 1]
+        """
+        frames = np.asarray(block)
+        if frames.ndim == 1:
+            frames = frames[np.newaxis]
+        if frames.ndim != 2 or len(frames) != self.channels:
+            raise RuntimeError(
+                f"block of shape {np.shape(block)} is not "
+                f"({self.channels}, nsamples)"
+            )
+        # interleaved (nsamples, channels)
+        frames = frames.T
+        nbytes = (self.nframes + len(frames)) * self.channels * self.width
+        if self._offset + nbytes > 2 ** 32 - 1:
+            raise RuntimeError("RIFF/WAVE files are limited to 4 GiB")
+        if self.scale is None:
+            data = frames.astype("<f4").tobytes()
+        else:
+            x = np.multiply(frames, self.scale, dtype=np.float64)
+            if self.dither:
+                x += self.rng.random(x.shape)
+                x -= self.rng.random(x.shape)
+            np.rint(x, out=x)
+            np.clip(x, -self.scale, self.scale - 1, out=x)
+            if self.width == 2:
+                data = x.astype("<i2").tobytes()
+            else:
+                # little endian int32, least significant three bytes
+                data = np.ascontiguousarray(x, dtype="<i4").view(np.uint8)
+                data = data.reshape(-1, 4)[:, :3].tobytes()
+        self.file.write(data)
+        self.nframes += len(frames)
+        return None
+
+    def write_all(
+        self,
+        y: (Array, Waveform),
+        blocksize: Integer = BLOCKSIZE,
+    ) -> None:
+        """
+        :param y: samples, or a Waveform whose blocks are written as they
+            are rendered
+        """
+        if not isinstance(y, Waveform):
+            y = Waveform(np.asarray(y))
+        for block in y.blocks(blocksize):
+            self.write(block)
+        return None
+
+    def close(self) -> None:
+        if self.file.closed:
+            return None
+        nbytes = self.nframes * self.channels * self.width
+        if nbytes % 2:
+            # chunks are word aligned
+            self.file.write(b"\x00")
+        self.file.seek(4)
+        riff = self._offset - 8 + nbytes + nbytes % 2
+        self.file.write(struct.pack("<I", riff))
+        if self.tag == 3:
+            self.file.seek(self._fact)
+            self.file.write(struct.pack("<I", self.nframes))
+        self.file.seek(self._offset - 4)
+        self.file.write(struct.pack("<I", nbytes))
+        self.file.close()
+        return None
+
+    def _header(self):
+        block_align = self.channels * self.width
+        fmt = struct.pack(
+            "<HHIIHH",
+            self.tag,
+            self.channels,
+            self.fs,
+            self.fs * block_align,
+            block_align,
+            8 * self.width,
+        )
+        header = b"RIFF" + struct.pack("<I", 0) + b"WAVE"
+        if self.tag == 1:
+            header += b"fmt " + struct.pack("<I", 16) + fmt
+        else:
+            # non-PCM formats carry an (empty) extension and a fact chunk
+            header += b"fmt " + struct.pack("<I", 18) + fmt
+            header += struct.pack("<H", 0)
+            header += b"fact" + struct.pack("<I", 4)
+            self._fact = len(header)
+            header += struct.pack("<I", 0)
+        header += b"data" + struct.pack("<I", 0)
+        self._offset = len(header)
+        self.file.write(header)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
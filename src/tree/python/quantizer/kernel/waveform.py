@@ -1,4 +1,4 @@
-from quantizer.kernel.util import Array, Integer, Scalar
+from quantizer.kernel.util import Array, Integer, Scalar, String, BLOCKSIZE
 import numpy as np
 
 
@@ -12,42 +12,77 @@ class Waveform:
     def set_ndarray(self, ndarray):
         self._ndarray = ndarray
 
+    def fingerprint(self):
+        return self.get_ndarray()
+
+    def save(self, file_path: String) -> None:
+        np.save(file_path, self.get_ndarray())
+
+    @classmethod
+    def load(cls, file_path: String, mmap_mode: String = 'r'):
+        """
+        Reopening of a saved waveform; by default the samples are memory
+        mapped instead of read, so a finished stem is not copied into RAM.
+
+        :param file_path: .npy file written by save
+        :param mmap_mode: np.load memory-map mode (None reads the file)
+        """
+        return cls(np.load(file_path, mmap_mode=mmap_mode))
+
+    def blocks(self, blocksize: Integer = BLOCKSIZE):
+        """
+        Iteration over consecutive blocks (views) of the last axis.
+
+        :param blocksize: number of samples per block
+        :return: generator of ndarray blocks
+        """
+        ndarray = self.get_ndarray()
+        for i in range(0, ndarray.shape[-1], blocksize):
+            yield ndarray[..., i: i + blocksize]
+
+    def defer(self):
+        """
+        Opt-in lazy arithmetic: the returned Expression records + and *
+        instead of evaluating them.
+        """
+        return Expression(None, [self])
+
     def add(self, other):
         if isinstance(other, Scalar):
-            return Waveform(self._ndarray + other)
+            return Waveform(self.get_ndarray() + other)
         elif isinstance(other, Array):
-            return Waveform(self._ndarray + other)
+            return Waveform(self.get_ndarray() + other)
         elif isinstance(other, Waveform):
-            return Waveform(self._ndarray + other.get_ndarray())
+            return Waveform(self.get_ndarray() + other.get_ndarray())
         else:
             raise RuntimeError
 
     def mul(self, other):
         if isinstance(other, Scalar):
-            return Waveform(self._ndarray * other)
+            return Waveform(self.get_ndarray() * other)
         elif isinstance(other, Array):
-            return Waveform(self._ndarray * other)
+            return Waveform(self.get_ndarray() * other)
         elif isinstance(other, Waveform):
-            return Waveform(self._ndarray * other.get_ndarray())
+            return Waveform(self.get_ndarray() * other.get_ndarray())
         else:
             raise RuntimeError
 
     def matmul(self, other, r):
         if isinstance(other, Integer):
-            return Waveform(np.tile(self._ndarray, other))
+            return Waveform(np.tile(self.get_ndarray(), other))
         elif isinstance(other, Array):
             if r:
-                return Waveform(np.concatenate([other, self._ndarray]))
+                return Waveform(np.concatenate([other, self.get_ndarray()]))
             else:
-                return Waveform(np.concatenate([self._ndarray, other]))
+                return Waveform(np.concatenate([self.get_ndarray(), other]))
         elif isinstance(other, Waveform):
             if r:
                 return Waveform(
-                    np.concatenate([other.get_ndarray(), self._ndarray])
+                    np.concatenate([other.get_ndarray(), self.get_ndarray()])
                 )
             else:
                 return Waveform(
-                    np.concatenate([self._ndarray, other.get_ndarray()])
+                    np.concatenate([self.get_ndarray(), other.get_ndarray()])
                 )
         else:
             raise RuntimeError
@@ -71,7 +106,183 @@ class Waveform:
         return self.matmul(other, r=True)
 
     def __len__(self):
-        return len(self._ndarray)
+        return len(self.get_ndarray())
+
+
+class Expression(Waveform):
+    """
+    Deferred elementwise arithmetic over Waveforms.
+
+    Operators build a graph which is evaluated once, block by block, with
+    every operation writing into a preallocated block buffer (NumPy out=),
+    so intermediate results never exist at full length.
+    """
+
+    # samples per chunk when the full length is rendered
+    chunksize: Integer = 2 ** 16
+
+    def __init__(self, op, operands):
+        super().__init__()
+        self.op = op
+        self.operands = [
+            Waveform(o) if isinstance(o, Array) else o for o in operands
+        ]
+
+    def add(self, other):
+        if isinstance(other, (*Scalar, Array, Waveform)):
+            return Expression(np.add, [self, other])
+        else:
+            raise RuntimeError
+
+    def mul(self, other):
+        if isinstance(other, (*Scalar, Array, Waveform)):
+            return Expression(np.multiply, [self, other])
+        else:
+            raise RuntimeError
+
+    def matmul(self, other, r):
+        return Waveform(self.get_ndarray()).matmul(other, r)
+
+    def leaves(self):
+        """
+        Unique Waveform leaves of the graph in evaluation order.
+        """
+        leaves = dict()
+        for o in self.operands:
+            if isinstance(o, Expression):
+                for leaf in o.leaves():
+                    leaves[id(leaf)] = leaf
+            elif isinstance(o, Waveform):
+                leaves[id(o)] = o
+        return list(leaves.values())
+
+    def get_ndarray(self):
+        if self._ndarray is None:
+            out, plan = None, None
+            i = 0
+            for chunk in self._chunks(Expression.chunksize):
+                if plan is None:
+                    plan = self._plan(chunk)
+                    shape, dtype = plan[0][id(self)]
+                    out = np.empty(shape + (len(self),), dtype=dtype)
+                n = next(iter(chunk.values())).shape[-1]
+                self._evaluate(chunk, out[..., i: i + n], plan)
+                i += n
+            self._ndarray = out
+        return self._ndarray
+
+    def blocks(self, blocksize: Integer = BLOCKSIZE):
+        if self._ndarray is not None:
+            yield from super().blocks(blocksize)
+            return
+        plan = None
+        for chunk in self._chunks(blocksize):
+            if plan is None:
+                plan = self._plan(chunk)
+            shape, dtype = plan[0][id(self)]
+            n = next(iter(chunk.values())).shape[-1]
+            out = np.empty(shape + (n,), dtype=dtype)
+            yield self._evaluate(chunk, out, plan)
+
+    def _chunks(self, blocksize):
+        leaves = self.leaves()
+        # blocks of leaves of different lengths would stop at the end of
+        # the shortest one; eager arithmetic raises instead
+        lengths = [self._nsamples(leaf) for leaf in leaves]
+        if len(set(lengths)) > 1:
+            raise ValueError(
+                f"operands could not be broadcast together with lengths "
+                f"{' '.join(map(str, lengths))}"
+            )
+        for blocks in zip(*[leaf.blocks(blocksize) for leaf in leaves]):
+            yield {id(leaf): b for leaf, b in zip(leaves, blocks)}
+
+    @staticmethod
+    def _nsamples(leaf):
+        # a lazy leaf knows its length without being rendered
+        if leaf._ndarray is None:
+            return len(leaf)
+        return leaf._ndarray.shape[-1]
+
+    def _plan(self, chunk):
+        """
+        Shape (without the sample axis) and dtype of every node, worked
+        out bottom up from the first chunk, once per evaluation; dtypes
+        promote as in eager arithmetic. Scratch buffers are shared by the
+        operands at the same nesting depth, each of which is consumed by
+        its parent before the next one is evaluated.
+
+        :return: (shape, dtype) by node id, scratch buffers
+        """
+        plan = dict()
+        stack = [self]
+        while stack:
+            node = stack[-1]
+            pending = [
+                o for o in node.operands
+                if isinstance(o, Expression) and id(o) not in plan
+            ]
+            if pending:
+                stack.extend(pending)
+                continue
+            stack.pop()
+            shapes, dtypes = [], []
+            for o in node.operands:
+                if isinstance(o, Expression):
+                    shape, dtype = plan[id(o)]
+                elif isinstance(o, Waveform):
+                    shape, dtype = chunk[id(o)].shape[:-1], chunk[id(o)].dtype
+                else:
+                    dtypes.append(o)
+                    continue
+                shapes.append(shape)
+                dtypes.append(dtype)
+            plan[id(node)] = (
+                np.broadcast_shapes(*shapes), np.result_type(*dtypes)
+            )
+        return plan, dict()
+
+    def _scratch(self, plan, n, depth):
+        shape, dtype = plan[0][id(self)]
+        key = (depth, shape, dtype)
+        buffer = plan[1].get(key)
+        if buffer is None or buffer.shape[-1] < n:
+            buffer = np.empty(shape + (n,), dtype=dtype)
+            plan[1][key] = buffer
+        return buffer[..., :n]
+
+    def _operand(self, o, chunk, plan, n, depth):
+        if isinstance(o, Expression):
+            if o.op is None:
+                return chunk[id(o.operands[0])]
+            return o._evaluate(
+                chunk, o._scratch(plan, n, depth), plan, depth
+            )
+        elif isinstance(o, Waveform):
+            return chunk[id(o)]
+        else:
+            return o
+
+    def _evaluate(self, chunk, out, plan, depth=0):
+        if self.op is None:
+            np.copyto(out, chunk[id(self.operands[0])])
+            return out
+        n = out.shape[-1]
+        head, *tail = self.operands
+        if isinstance(head, Expression) and head.op is not None:
+            head = head._evaluate(chunk, out, plan, depth)
+        else:
+            head = self._operand(head, chunk, plan, n, depth + 1)
+        for o in tail:
+            o = self._operand(o, chunk, plan, n, depth + 1)
+            self.op(head, o, out=out)
+            head = out
+        return out
+
+    def __len__(self):
+        if self._ndarray is not None:
+            return self._ndarray.shape[-1]
+        return self._nsamples(self.leaves()[0])
 
 
 class Stream(Waveform):
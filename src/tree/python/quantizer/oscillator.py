@@ -1,10 +1,14 @@
 from quantizer.kernel.kontext import kntxt
 from quantizer.kernel.util import (
-    Array, Scalar, String, broadcast, bounce, transpose
+    Array, Boolean, Float, Integer, Scalar, String, Tuple, BLOCKSIZE,
+    broadcast, transpose
 )
+from quantizer.kernel.cache import cached
+from quantizer.kernel.playback import Player
+from quantizer.kernel.wav import WaveWriter
 from quantizer.kernel.waveform import Controller
 from quantizer.controller import (
-    BipolarController, StaticController, cast
+    BipolarController, StaticController, cast, constant
 )
 from quantizer.wavetable import Wavetable, Sine
 import numpy as np
@@ -19,41 +23,156 @@ class Oscillator(BipolarController):
         p: (Scalar, Array, Controller) = None,
         a: (Scalar, Array, Controller) = None,
         detune: (Scalar, Array, Controller) = 0,
+        lazy: Boolean = False,
     ):
         super().__init__()
-        if not dt:
+        if dt is None:
             dt = StaticController(1 / kntxt().fs)
-        if not f:
+        if f is None:
             f = kntxt().f
-        if not p:
+        if p is None:
             p = kntxt().p
-        if not a:
+        if a is None:
             a = kntxt().a
-        wt = wt
-        dt = cast(dt)
-        f = cast(f)
-        p = cast(p)
-        a = cast(a)
-        detune = cast(detune)
-        fd = self.detune(f, detune)
-        phase_derivative = (
-            2 * np.pi
-            * fd.get_ndarray()
-            * dt.get_ndarray()
+        self.wt = wt
+        self.dt = cast(dt)
+        self.f = cast(f)
+        self.p = cast(p)
+        self.a = cast(a)
+        self.ct = cast(detune)
+        self.lazy = lazy
+        if not lazy:
+            self._ndarray = self._render_cached()
+
+    def _render_cached(self) -> Array:
+        """
+        Full-length render, looked up in the render cache of the context.
+        """
+        return cached(
+            self._render_full,
+            'Oscillator', self.wt, self.dt, self.f, self.p, self.a, self.ct,
         )
-        phase_integral = np.cumsum(phase_derivative)
-        phase = phase_integral + p.get_ndarray()
-        self._ndarray = a.get_ndarray() * wt.render(phase)
+
+    def _render_full(self) -> Array:
+        """
+        Full-length render; with a scratch directory the samples are
+        rendered in chunks straight into a memory-mapped buffer, so
+        neither the result nor the temporaries need to fit in RAM.
+        """
+        if not kntxt().scratch:
+            return self._render(0, len(self.f), 0.)[0]
+        y = kntxt().allocate(len(self.f))
+        i = 0
+        for block in self.blocks(kntxt().chunksize):
+            y[i: i + len(block)] = block
+            i += len(block)
+        return y
+
+    def _render(
+        self,
+        start: Integer,
+        stop: Integer,
+        phi: Float,
+    ) -> Tuple:
+        """
+        Rendering of the samples [start, stop) given the phase integral phi
+        accumulated up to start.
+
+        :param start: first sample
+        :param stop: last sample (exclusive)
+        :param phi: phase integral at start
+        :return: rendered samples and phase integral at stop
+        """
+        n = len(self.f.get_ndarray()[start: stop])
+        f = self._window(self.f, start, stop)
+        ct = self._window(self.ct, start, stop)
+        dt = self._window(self.dt, start, stop)
+        p = self._window(self.p, start, stop)
+        a = self._window(self.a, start, stop)
+
+        # constant controllers are scalars: a constant frequency has a
+        # closed-form phase integral, and no detune, phase offset or unit
+        # amplitude costs no pass over the samples
+        # the phase is integrated in float64 whatever the sample dtype
+        fd = f
+        if not (isinstance(ct, Float) and ct == 0):
+            fd = transpose(np.asarray(f, dtype=np.float64), ct=ct)
+        if isinstance(fd, Float) and isinstance(dt, Float):
+            phase_integral = np.arange(1, n + 1) * (2 * np.pi * fd * dt)
+        else:
+            phase_integral = np.multiply(fd, 2 * np.pi, dtype=np.float64)
+            phase_integral *= dt
+            np.cumsum(phase_integral, out=phase_integral)
+        phase_integral += phi
+        if len(phase_integral):
+            phi = phase_integral[-1] % (2 * np.pi)
+        if not (isinstance(p, Float) and p == 0):
+            phase_integral += p
+        y = self.wt.render(phase_integral, fd)
+        y = y.astype(kntxt().dtype, copy=False)
+        if not (isinstance(a, Float) and a == 1):
+            y *= a
+        return y, phi
+
+    @staticmethod
+    def _window(c: Controller, start: Integer, stop: Integer):
+        """
+        Samples [start, stop) of c, or its value if constant.
+        """
+        value = constant(c)
+        if value is not None:
+            return float(value)
+        return c.get_ndarray()[start: stop]
+
+    def get_ndarray(self):
+        if self._ndarray is None:
+            self._ndarray = self._render_cached()
+        return self._ndarray
+
+    def blocks(self, blocksize: Integer = BLOCKSIZE):
+        """
+        Streaming render in blocks of blocksize samples; the phase integral
+        is carried from one block to the next, so memory does not grow with
+        the session length.
+
+        :param blocksize: number of samples per block
+        :return: generator of ndarray blocks
+        """
+        if self._ndarray is not None:
+            yield from super().blocks(blocksize)
+            return
+        phi = 0.
+        for i in range(0, len(self.f), blocksize):
+            y, phi = self._render(i, i + blocksize, phi)
+            yield y
 
     @staticmethod
     def detune(f: Controller, detune: Controller) -> Controller:
         return Controller(transpose(f.get_ndarray(), ct=detune.get_ndarray()))
 
-    def broadcast(self) -> None:
-        broadcast(self._ndarray, fs=kntxt().fs)
+    def broadcast(self, realtime: Boolean = False) -> None:
+        """
+        :param realtime: stream the blocks to the output as they are
+            rendered instead of rendering first (see Player)
+        """
+        if realtime:
+            Player(self, kntxt().fs).play()
+        else:
+            broadcast(self.get_ndarray(), fs=kntxt().fs)
+
+    def bounce(
+        self,
+        file_path: String = "oscillator.wav",
+        format: String = "float32",
+    ) -> None:
+        """
+        A lazy oscillator is written block by block as it is rendered.
+        """
+        with WaveWriter(file_path, kntxt().fs, format=format) as writer:
+            writer.write_all(self)
 
-    def bounce(self, file_path: String = "oscillator.wav") -> None:
-        bounce(self._ndarray, file_path=file_path, fs=kntxt().fs)
+    def __len__(self):
+        return len(self.f)
 
 
 Osc = Oscillator
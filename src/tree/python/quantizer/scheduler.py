@@ -0,0 +1,168 @@
+from quantizer.kernel.kontext import kntxt, Context
+from quantizer.kernel.util import (
+    Array, Callable, Integer, Scalar, Sequence, String, Tuple
+)
+from quantizer.kernel.waveform import Controller, Stream
+from quantizer.envelope import ADSREnvelope, FMEnvelope
+from quantizer.oscillator import Oscillator
+from quantizer.sequencer import Pattern, Sequencer
+from quantizer.wavetable import Wavetable, Sine
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+import __main__
+import numpy as np
+import os
+
+
+class Voice:
+    def __init__(
+        self,
+        wt: Wavetable = Sine(),
+        pattern: Pattern = None,
+        envelope: Callable = ADSREnvelope,
+        f: (Scalar, Array, Controller) = None,
+        p: (Scalar, Array, Controller) = None,
+        a: (Scalar, Array, Controller) = None,
+        detune: (Scalar, Array, Controller) = 0,
+        fx: Sequence = (),
+        level: Scalar = 0,
+    ):
+        """
+        Definition of an independent voice: an oscillator of wt played by
+        pattern, followed by a chain of effects. Voices are rendered by a
+        Scheduler; a voice owns its effects, which must not be shared.
+
+        :param pattern: the frequency follows the pattern (FMEnvelope)
+            and the amplitude its envelope, unless f or a are given
+        :param envelope: amplitude envelope class (or callable) of pattern
+        :param fx: effects applied in order by patch()
+        :param level: line level [dB] in the mix
+        """
+        self.wt = wt
+        self.pattern = pattern
+        self.envelope = envelope
+        self.f = f
+        self.p = p
+        self.a = a
+        self.detune = detune
+        self.fx = fx
+        self.level = level
+
+    def render(self) -> Array:
+        f, a = self.f, self.a
+        if self.pattern is not None:
+            if f is None:
+                f = FMEnvelope(self.pattern)
+            if a is None:
+                a = self.envelope(self.pattern)
+        stream = Stream(
+            Oscillator(
+                self.wt, f=f, p=self.p, a=a, detune=self.detune
+            ).get_ndarray()
+        )
+        for fx in self.fx:
+            stream = fx.patch(stream)
+        return stream.get_ndarray()
+
+
+class Scheduler:
+    def __init__(
+        self,
+        voices: Sequence,
+        workers: Integer = None,
+        mode: String = "thread",
+    ):
+        """
+        Parallel rendering of independent voices, one voice per task.
+
+        In "thread" mode voices are rendered by a thread pool: the NumPy
+        routines and the numba kernels (compiled with nogil) release the
+        GIL, so voices render concurrently in one process. In "process"
+        mode they are rendered by a process pool, each worker with a copy
+        of the context, writing its voice straight into a shared memory
+        buffer.
+
+        :param voices: Voice definitions
+        :param workers: number of workers (default: number of CPUs)
+        :param mode: "thread" or "process"
+        """
+        if mode not in ("thread", "process"):
+            raise RuntimeError
+        self.voices = list(voices)
+        self.workers = workers or os.cpu_count()
+        self.mode = mode
+
+    def render(self) -> Array:
+        """
+        :return: (nvoices, nsamples) voices, truncated to the context
+        """
+        shape = (len(self.voices), len(kntxt()))
+        if self.mode == "thread":
+            out = kntxt().allocate(shape)
+            with ThreadPoolExecutor(self.workers) as executor:
+                for _ in executor.map(
+                    lambda i: _write(out, i, self.voices[i]),
+                    range(len(self.voices)),
+                ):
+                    pass
+            return out
+        dtype = kntxt().dtype
+        shm = shared_memory.SharedMemory(
+            create=True, size=max(1, int(np.prod(shape)) * dtype.itemsize)
+        )
+        try:
+            with ProcessPoolExecutor(
+                self.workers,
+                initializer=_initialize,
+                initargs=(Scheduler._context(kntxt()),),
+            ) as executor:
+                for _ in executor.map(
+                    _render,
+                    [
+                        (voice, i, shm.name, shape, dtype.str)
+                        for i, voice in enumerate(self.voices)
+                    ],
+                ):
+                    pass
+            out = kntxt().allocate(shape)
+            out[:] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        finally:
+            shm.close()
+            shm.unlink()
+        return out
+
+    def mix(self) -> Stream:
+        return Sequencer._mix(
+            [Stream(y) for y in self.render()],
+            [voice.level for voice in self.voices],
+        )
+
+    @staticmethod
+    def _context(c: Context) -> Tuple:
+        return c.bpm, c.fs, c.nsamples, c.dtype, c.scratch
+
+
+def _write(out, i, voice):
+    y = voice.render()
+    n = min(y.shape[-1], out.shape[-1])
+    out[i, :n] = y[..., :n]
+
+
+def _initialize(context):
+    bpm, fs, nsamples, dtype, scratch = context
+    setattr(
+        __main__,
+        "KNTXT",
+        Context(
+            bpm=bpm, fs=fs, nsamples=nsamples, dtype=dtype, scratch=scratch
+        ),
+    )
+
+
+def _render(task):
+    voice, i, name, shape, dtype = task
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        _write(np.ndarray(shape, dtype=dtype, buffer=shm.buf), i, voice)
+    finally:
+        shm.close()
@@ -1,10 +1,9 @@
 from quantizer.kernel.kontext import kntxt
 from quantizer.kernel.util import (
-    Boolean, Scalar, Sequence, Integer, String, List, beats2samples, bounce,
-    db2mag, midi2freq, midi2mag, minmaxscale_i16, transpose
+    Array, Boolean, Dict, Scalar, Sequence, Integer, String, List, Tuple,
+    beats2samples, bounce, db2mag, midi2freq, midi2mag, transpose
 )
 from quantizer.kernel.waveform import Stream
-from copy import deepcopy
 import numpy as np
 from uuid import uuid1
 import yaml
@@ -12,6 +11,8 @@ import yaml
 
 class Event:
 
+    __slots__ = ('idle', 'nsamples', 'f', 'p', 'a', 'cc')
+
     nsamples_default = beats2samples(
         beats=1.0,
         bpm=kntxt().bpm,
@@ -19,6 +20,10 @@ class Event:
     )
     f_default = midi2freq(36)
 
+    # count of changes to any event, by which a pattern tells whether the
+    # events it has built its columns from may have changed
+    changes: Integer = 0
+
     def __init__(
             self,
             idle: Boolean = False,
@@ -35,6 +40,12 @@ class Event:
         self.a = a
         self.cc = cc
 
+    def __setattr__(self, name, value):
+        # a new event is part of no pattern yet
+        if hasattr(self, name):
+            Event.changes += 1
+        object.__setattr__(self, name, value)
+
     def get_idle(self):
         return self.idle
 
@@ -68,57 +79,278 @@ class Event:
 
 class Pattern:
 
+    dtype = np.dtype([
+        ('onset', np.int64),
+        ('nsamples', np.int64),
+        ('f', np.float64),
+        ('p', np.float64),
+        ('a', np.float64),
+        ('idle', np.bool_),
+    ])
+
+    class Node:
+        """
+        Immutable composition tree: a node is either a leaf holding event
+        columns or the concatenation of its children, repeated and
+        transposed (in cents). Composing patterns only creates nodes;
+        the events are flattened once, when they are read.
+        """
+
+        __slots__ = ('table', 'cc', 'children', 'repeat', 'cents')
+
+        def __init__(
+            self,
+            table: Array = None,
+            cc: Array = None,
+            children: Tuple = (),
+            repeat: Integer = 1,
+            cents: Scalar = 0,
+        ):
+            self.table = table
+            self.cc = cc
+            self.children = children
+            self.repeat = repeat
+            self.cents = cents
+
+        def flatten(self) -> Tuple:
+            """
+            Flattens the tree in one depth-first pass with an explicit
+            stack, so that the depth of a composition (e.g. song = song @
+            bar in a loop) is not limited by the recursion limit, and the
+            cost is linear in the number of nodes: plain concatenations
+            append their leaves to the output of their parent, only
+            subtrees which are shared, repeated or transposed are joined
+            on their own, and a joined subtree is released once its last
+            parent has taken it.
+
+            :return: event columns and control changes
+            """
+            if self.table is not None:
+                return self.table, self.cc
+            parents = self._parents()
+            memo = dict()
+            # frames of the nodes being joined: node, output, next child
+            stack = [[self, [], 0]]
+            while True:
+                frame = stack[-1]
+                node, parts, i = frame
+                if i < len(node.children):
+                    frame[2] += 1
+                    child = node.children[i]
+                    if child.table is not None:
+                        parts.append((child.table, child.cc))
+                    elif id(child) in memo:
+                        parts.append(memo[id(child)])
+                        parents[id(child)] -= 1
+                        if not parents[id(child)]:
+                            del memo[id(child)]
+                    elif (
+                        parents[id(child)] > 1
+                        or child.repeat != 1
+                        or child.cents
+                    ):
+                        stack.append([child, [], 0])
+                    else:
+                        stack.append([child, parts, 0])
+                    continue
+                stack.pop()
+                if not stack:
+                    return Pattern.Node._join(
+                        parts * node.repeat, node.cents
+                    )
+                if parts is not stack[-1][1]:
+                    joined = Pattern.Node._join(
+                        parts * node.repeat, node.cents
+                    )
+                    stack[-1][1].append(joined)
+                    parents[id(node)] -= 1
+                    if parents[id(node)]:
+                        memo[id(node)] = joined
+
+        def _parents(self):
+            # number of references to every inner node below self
+            parents = dict()
+            stack = [self]
+            while stack:
+                for child in stack.pop().children:
+                    if child.table is not None:
+                        continue
+                    if id(child) not in parents:
+                        parents[id(child)] = 0
+                        stack.append(child)
+                    parents[id(child)] += 1
+            return parents
+
+        @staticmethod
+        def _join(parts, cents=0):
+            if len(parts) == 1 and not cents:
+                return parts[0]
+            table = np.concatenate(
+                [np.zeros(0, dtype=Pattern.dtype), *[t for t, _ in parts]]
+            )
+            table['onset'][:1] = 0
+            np.cumsum(table['nsamples'][:-1], out=table['onset'][1:])
+            if cents:
+                table['f'] = transpose(table['f'], ct=cents)
+            table.flags.writeable = False
+            cc = np.concatenate(
+                [np.empty(0, dtype=object), *[cc for _, cc in parts]]
+            )
+            return table, cc
+
     def __init__(
         self,
         identifier: String = str(uuid1()),
         events: List = None,
         patterns: Sequence = None,
     ):
+        """
+        Patterns are copy-on-write: composition with @ and transpose
+        references the operands' trees instead of copying events, and a
+        later append to an operand does not affect the composition.
+
+        The events of a pattern are a live list of Event objects: the
+        list given as events (unless patterns are given too), or the one
+        built by the first read of events (or get_events()). Appending to
+        it or changing its events changes the pattern, as does assigning
+        a new list to events. The event columns built from the list are
+        kept until an event changes.
+        """
         self.identifier = identifier
-        self.events = []
-        if events:
-            self.events = events
+        self._node = Pattern.Node(children=())
+        self._pending = []
+        self._events = None
+        self._leaf = None
+        if events is not None and not patterns:
+            self._events = events
+        elif events:
+            self._pending.extend(events)
         if patterns:
-            for p in patterns:
-                events = p.get_events()
-                for e in events:
-                    self.events.append(e)
+            self._node = Pattern.Node(
+                children=(self._root(), *[p._root() for p in patterns])
+            )
+
+    @property
+    def events(self):
+        return self.get_events()
+
+    @events.setter
+    def events(self, events: List):
+        self._node = Pattern.Node(children=())
+        self._pending = []
+        self._events = events
+        self._leaf = None
 
     def get_identifier(self):
         return self.identifier
 
     def get_events(self):
-        return self.events
+        if self._events is None:
+            # from here on the event objects are the state of the pattern
+            self.events = list(self.iter_events())
+        return self._events
+
+    def iter_events(self):
+        """
+        Iteration over the events without making them the state of the
+        pattern: the live events if there are, new Event objects built
+        from the event columns otherwise.
+        """
+        if self._events is not None:
+            yield from self._events
+            return
+        for (_, nsamples, f, p, a, idle), cc in zip(
+            self.get_event_array().tolist(), self.get_cc_array()
+        ):
+            yield Event(bool(idle), nsamples, f, p, a, cc)
+
+    def get_event_array(self):
+        """
+        Columnar representation of the events as a structured array with
+        fields onset and nsamples [samples], f, p, a and idle. The array
+        is shared and read-only.
+        """
+        return self._flatten()[0]
+
+    def get_cc_array(self):
+        return self._flatten()[1]
+
+    def fingerprint(self):
+        return self.get_event_array(), self.get_cc_array()
 
     def append(self, event: Event):
-        self.events.append(event)
+        if self._events is not None:
+            self._events.append(event)
+        else:
+            self._pending.append(event)
 
     def transpose(self, oc=0, st=0, ct=0):
-        events = deepcopy(self.events)
-        for e in events:
-            e.set_f(transpose(e.get_f(), *[oc, st, ct]))
-        return Pattern(events=events)
+        return Pattern._from_node(
+            Pattern.Node(
+                children=(self._root(),),
+                cents=1200 * oc + 100 * st + 1 * ct,
+            )
+        )
 
     def matmul(self, other, r):
         if isinstance(other, Integer):
-            events = []
-            for _ in range(other):
-                events += deepcopy(self.events)
-            return Pattern(events=events)
+            return Pattern._from_node(
+                Pattern.Node(children=(self._root(),), repeat=other)
+            )
         elif isinstance(other, Pattern):
+            children = (self._root(), other._root())
             if r:
-                events = deepcopy(other.get_events())
-                for e in self.events:
-                    events.append(deepcopy(e))
-                return Pattern(events=events)
-            else:
-                events = deepcopy(self.events)
-                for e in other.get_events():
-                    events.append(deepcopy(e))
-                return Pattern(events=events)
+                children = children[::-1]
+            return Pattern._from_node(Pattern.Node(children=children))
         else:
             raise RuntimeError
 
+    def _root(self):
+        if self._events is not None:
+            # the leaf is rebuilt if the list or any event has changed
+            if (
+                self._leaf is None
+                or self._leaf[0] != Event.changes
+                or self._leaf[1] != self._events
+            ):
+                leaf = Pattern._leaf(self._events)
+                self._leaf = Event.changes, list(self._events), leaf
+            return self._leaf[2]
+        if self._pending:
+            leaf = Pattern._leaf(self._pending)
+            self._pending = []
+            if self._node.table is None and not self._node.children:
+                self._node = leaf
+            else:
+                self._node = Pattern.Node(children=(self._node, leaf))
+        return self._node
+
+    @staticmethod
+    def _leaf(events):
+        table = np.zeros(len(events), dtype=Pattern.dtype)
+        table['nsamples'] = [e.get_nsamples() for e in events]
+        table['f'] = [e.get_f() for e in events]
+        table['p'] = [e.get_p() for e in events]
+        table['a'] = [e.get_a() for e in events]
+        table['idle'] = [e.get_idle() for e in events]
+        cc = np.empty(len(events), dtype=object)
+        cc[:] = [e.get_cc() for e in events]
+        np.cumsum(table['nsamples'][:-1], out=table['onset'][1:])
+        table.flags.writeable = False
+        return Pattern.Node(table, cc)
+
+    def _flatten(self):
+        node = self._root()
+        if node.table is None:
+            node.table, node.cc = node.flatten()
+        return node.table, node.cc
+
+    @staticmethod
+    def _from_node(node):
+        pattern = Pattern()
+        pattern._node = node
+        return pattern
+
     def __matmul__(self, other):
         return self.matmul(other, r=False)
 
@@ -130,6 +362,8 @@ class Sequencer:
 
     class YAMLEvent(Event):
 
+        __slots__ = ()
+
         def __init__(
             self,
             idle: Boolean = False,
@@ -169,11 +403,21 @@ class Sequencer:
             streams=self.streams,
             line_levels=self.line_levels
         )
-        mix = db2mag(self.master_level) * mix.get_ndarray()
+        mix = mix.get_ndarray()
+        if self.master_level:
+            mix *= db2mag(self.master_level)
         return mix
 
-    def export(self, file_path: str = "sequencer.wav"):
-        bounce(minmaxscale_i16(self.mix()), file_path, kntxt().fs)
+    def export(
+        self,
+        file_path: str = "sequencer.wav",
+        format: String = "int16",
+    ):
+        """
+        :param format: sample format, "int16" (dithered), "int24"
+            (dithered) or "float32"
+        """
+        bounce(self.mix(), file_path, kntxt().fs, format=format)
 
     def load_yaml(self, file_path: str):
         manuscript = yaml.load(open(file_path, 'r'), Loader=yaml.BaseLoader)
@@ -193,39 +437,39 @@ class Sequencer:
 
     @staticmethod
     def _mix(streams: Sequence, line_levels: Sequence = None) -> Stream:
-        dim = []
-        for stream in streams:
-            dim.append(len(stream))
-        streams = Sequencer._pad(unpadded_streams=streams, n=max(dim))
+        """
+        Sum of the streams, each scaled by its line level [dB], into one
+        preallocated output: streams of different lengths are added to
+        the leading slice of the output, and scaled streams go through a
+        scratch block of at most Context.chunksize samples, so memory is
+        O(output) whatever the number of tracks.
+        """
+        ndarrays = [stream.get_ndarray() for stream in streams]
         if line_levels:
-            streams = Sequencer._line_level(streams, line_levels=line_levels)
-        mix = np.zeros(max(dim))
-        for stream in streams:
-            mix += stream.get_ndarray()
+            assert len(streams) == len(line_levels)
+            gains = [db2mag(line_level) for line_level in line_levels]
+        else:
+            gains = [1.] * len(ndarrays)
+        shape = np.broadcast_shapes(*[x.shape[:-1] for x in ndarrays])
+        n = max(x.shape[-1] for x in ndarrays)
+        mix = kntxt().allocate(shape + (n,))
+        chunksize = kntxt().chunksize
+        scratch = None
+        for x, gain in zip(ndarrays, gains):
+            if gain == 1:
+                mix[..., :x.shape[-1]] += x
+                continue
+            for i in range(0, x.shape[-1], chunksize):
+                chunk = x[..., i: i + chunksize]
+                if scratch is None:
+                    scratch = np.empty(
+                        shape + (min(n, chunksize),), dtype=mix.dtype
+                    )
+                block = scratch[..., :chunk.shape[-1]]
+                np.multiply(chunk, gain, out=block, casting='unsafe')
+                mix[..., i: i + chunk.shape[-1]] += block
         return Stream(mix)
 
-    @staticmethod
-    def _pad(unpadded_streams, n):
-        padded_streams = []
-        for stream in unpadded_streams:
-            if len(stream) != n:
-                s = np.concatenate(
-                    [stream.get_array(), np.zeros(n - len(stream))]
-                )
-            else:
-                s = stream.get_array()
-            padded_streams.append(Stream(s))
-        return padded_streams
-
-    @staticmethod
-    def _line_level(streams, line_levels):
-        assert len(streams) == len(line_levels)
-        ll_streams = []
-        for i in range(len(streams)):
-            s = db2mag(line_levels[i]) * streams[i].get_array()
-            ll_streams.append(Stream(s))
-        return ll_streams
-
     def _parse_yaml_event(self, e: List) -> Event:
         if len(e) < 3:
             if len(e) == 0:
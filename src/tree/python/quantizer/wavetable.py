@@ -1,19 +1,55 @@
 from quantizer.kernel.kontext import kntxt
-from quantizer.kernel.util import Array, Integer, Scalar, midi2freq, normalize
+from quantizer.kernel.util import (
+    Array, Boolean, Dict, Integer, Scalar, midi2freq
+)
 from abc import ABC, abstractmethod
+from numba import jit
 import numpy as np
 
 np.random.seed(0)
 
 
 class Wavetable(ABC):
+    """
+    Subclasses implement fn over one period x in [-pi, pi) with a fixed
+    output range of [-1, 1]; no data dependent rescaling takes place, so
+    any render of any length or block size yields the same samples.
+
+    The band-limited tables of a tabulated wavetable are not rescaled
+    either, so that they keep the harmonic amplitudes of fn: those of
+    discontinuous waveforms ripple beyond [-1, 1] (Gibbs phenomenon),
+    by up to about 18% for Square and Saw, and up to 27% for a Square
+    reduced to a few harmonics at the highest frequencies.
+    """
+
+    _mipmaps: Dict = dict()
+
+    def __init__(self, tabulate: Boolean = False, size: Integer = 2048):
+        """
+        :param tabulate: render by interpolated lookup into band-limited
+            tables instead of evaluating fn on every sample
+        :param size: number of samples per table (power of two)
+        """
+        self.tabulate = tabulate
+        self.size = size
 
     @staticmethod
     @abstractmethod
     def fn(x: Array) -> Array:
         raise RuntimeError
 
-    def render(self, x: Array) -> Array:
+    def fingerprint(self):
+        return self.tabulate, self.size
+
+    def render(self, x: Array, f: (Scalar, Array) = None) -> Array:
+        """
+        :param x: phase [rad]
+        :param f: instantaneous frequency, selects the mipmap level of a
+            tabulated wavetable (full band if omitted)
+        :return: waveform
+        """
+        if self.tabulate:
+            return self.lookup(x, f)
         return self.fn(((x + np.pi) % (2 * np.pi)) - np.pi)
 
     def discretize(
@@ -28,62 +64,113 @@ class Wavetable(ABC):
         y = self.fn(x)
         return y
 
+    def mipmap(self) -> Array:
+        """
+        One period of fn per octave, band-limited by truncating its
+        spectrum: level k keeps the first (size / 2) >> k harmonics. Each
+        row carries a guard sample (= first sample) for interpolation.
+        Tables are computed once per wavetable class and size.
+        """
+        key = (type(self), self.size)
+        if key not in Wavetable._mipmaps:
+            n = self.size
+            nlevels = int(np.log2(n // 2)) + 1
+            x = np.linspace(-np.pi, np.pi, n, endpoint=False)
+            spectrum = np.fft.rfft(self.fn(x))
+            tables = np.empty((nlevels, n + 1))
+            for k in range(nlevels):
+                s = spectrum.copy()
+                s[((n // 2) >> k) + 1:] = 0
+                tables[k, :n] = np.fft.irfft(s, n)
+            tables[:, n] = tables[:, 0]
+            tables.flags.writeable = False
+            Wavetable._mipmaps[key] = tables
+        return Wavetable._mipmaps[key]
+
+    def lookup(self, x: Array, f: (Scalar, Array) = None) -> Array:
+        if f is None:
+            f = 0.
+        return self._lookup(
+            x, np.atleast_1d(f), self.mipmap(), float(kntxt().fs)
+        )
+
+    @staticmethod
+    @jit(nopython=True, nogil=True, cache=True)
+    def _lookup(x, f, tables, fs):
+        nlevels = tables.shape[0]
+        n = tables.shape[1] - 1
+        scale = n / (2 * np.pi)
+        y = np.empty(len(x))
+        f_prev = -1.
+        k = 0
+        for i in range(len(x)):
+            fi = abs(f[i]) if len(f) > 1 else abs(f[0])
+            if fi != f_prev:
+                # ceil(log2(fi * n / fs)): first level whose highest
+                # harmonic stays below the Nyquist frequency
+                v = fi * n / fs
+                k = int(np.ceil(np.log2(v))) if v > 1. else 0
+                k = min(k, nlevels - 1)
+                f_prev = fi
+            pos = (x[i] + np.pi) * scale
+            pos -= n * np.floor(pos / n)
+            j = min(int(pos), n - 1)
+            frac = pos - j
+            y[i] = tables[k, j] + frac * (tables[k, j + 1] - tables[k, j])
+        return y
+
 
 class Sine(Wavetable):
 
     @staticmethod
     def fn(x: Array) -> Array:
         y = np.sin(x)
-        return normalize(y)
+        return y
 
 
 class Square(Wavetable):
 
     @staticmethod
     def fn(x: Array) -> Array:
-        y1 = np.where(x < 0, -1, 0)
-        y2 = np.where(x > 0, 1, 0)
-        y = y1 + y2
-        return normalize(y)
+        y = np.sign(x)
+        return y
 
 
 class Saw(Wavetable):
 
     @staticmethod
     def fn(x: Array) -> Array:
-        y = x
-        return normalize(y)
+        y = x * (1 / np.pi)
+        return y
 
 
 class Triangle(Wavetable):
 
     @staticmethod
     def fn(x: Array) -> Array:
-        y1 = np.where(
-            x < (-np.pi / 2),
-            (-2 / np.pi) * x - 2,
-            0
-        )
-        y2 = np.where(
-            (x >= (-np.pi / 2)) & (x <= (np.pi / 2)),
-            (2 / np.pi) * x,
-            0
-        )
-        y3 = np.where(
-            x > (np.pi / 2),
-            (-2 / np.pi) * x + 2,
-            0
-        )
-        y = y1 + y2 + y3
-        return normalize(y)
+        # 1 - |2|x| / pi - 1| folds the ramp 2x / pi at +-pi / 2
+        y = np.abs(x)
+        y *= 2 / np.pi
+        y -= 1
+        np.abs(y, out=y)
+        np.subtract(1, y, out=y)
+        y *= np.sign(x)
+        return y
 
 
 class Noise(Wavetable):
 
+    def fingerprint(self):
+        # every render draws new samples
+        raise TypeError("Noise renders are not reproducible")
+
+    def render(self, x: Array, f: (Scalar, Array) = None) -> Array:
+        return self.fn(x)
+
     @staticmethod
     def fn(x: Array) -> Array:
         y = np.random.uniform(-1, 1, len(x))
-        return normalize(y)
+        return y
 
 
 Sin = Sine